@@ -1,16 +1,57 @@
-def individual_company_table_css(number_years: int) -> str:
-    time_series_table_width = 100
-    align = ""
+from Data_Retrieval.shared_functions import (
+    ALPHA_SCALE_FACTOR,
+    CELL_TONE_CLASSES,
+    CELL_TONE_COLOURS,
+    COLOUR_CLASS_BUCKETS,
+    CellStyleMode,
+    TrafficLightColors,
+    get_cell_style_mode,
+)
+
+
+def cell_class_css() -> str:
+    """The classes formatted cells reference instead of inline styles, green and red in alpha buckets."""
+    rules = [
+        ".cf { color: black; font-weight: bold; }",
+        ".bold { font-weight: bold; }",
+        ".ul { border-bottom: 1px solid black; }",
+    ]
+    for tone, tone_class in CELL_TONE_CLASSES.items():
+        colour = CELL_TONE_COLOURS[tone]
+        if tone_class in ("g", "r"):
+            for bucket in range(1, COLOUR_CLASS_BUCKETS + 1):
+                alpha = round(bucket / COLOUR_CLASS_BUCKETS / ALPHA_SCALE_FACTOR, 4)
+                rules.append(f".{tone_class}{bucket} {{ background: {colour.format(alpha=alpha)}; }}")
+        elif tone_class:
+            rules.append(f".{tone_class} {{ background: {colour}; }}")
+    for traffic_light in TrafficLightColors:
+        rules.append(f".tl-{traffic_light.name} {{ background: {traffic_light.value}; }}")
+
+    return "\n".join(f"\t\t\t{rule}" for rule in rules) + "\n"
+
+
+def get_time_series_layout(number_years: int) -> (int, str):
+    """Width (percent) and alignment of the time series tables, narrower for companies with few years."""
     if number_years < 5:
-        time_series_table_width = 40
-        align = "margin: 0 auto"
+        return 40, "margin: 0 auto"
     elif number_years < 10:
-        time_series_table_width = 60
-        align = "margin: 0 auto"
+        return 60, "margin: 0 auto"
+
+    return 100, ""
+
 
+def individual_company_table_css(number_years: int) -> str:
     return f"""
 		<style>
-			table {{
+{individual_company_table_rules(number_years)}		</style>
+		"""
+
+
+def individual_company_table_rules(number_years: int) -> str:
+    cell_classes = cell_class_css() if get_cell_style_mode() == CellStyleMode.classes else ""
+    time_series_table_width, align = get_time_series_layout(number_years)
+
+    return f"""			table {{
 				border-collapse: collapse;
 				width: 100%;
 			}}
@@ -178,6 +219,19 @@ def individual_company_table_css(number_years: int) -> str:
 			  border-left: 2px solid dimgray;
 			  border-right: 2px solid dimgray;
 			}}
-		
-		</style>
-		"""
+{cell_classes}		
+"""
+
+
+def individual_company_stylesheet() -> str:
+    """The rules every report shares, written once per output directory when assets are shared."""
+    return individual_company_table_rules(number_years=10)
+
+
+def time_series_layout_css(number_years: int) -> str:
+    """The one rule that differs between reports, narrowing the shared stylesheet's time series tables."""
+    time_series_table_width, align = get_time_series_layout(number_years)
+    if time_series_table_width == 100:
+        return ""
+
+    return f"<style>.time-series {{ width: {time_series_table_width}% !important; {align}; }}</style>"
@@ -0,0 +1,665 @@
+"""
+Exchange panel: the yearly statement fields the reports use for every company of a run, held as one
+contiguous ticker x fiscal year x field float array, so the highlight and valuation metrics of a whole
+exchange are computed in a few array operations instead of one small DataFrame per company.
+
+Years are right aligned, the last column always holds each company's latest fiscal year, and companies
+with a shorter history are padded with NaN on the left. JSON nulls are tracked in a separate mask because
+the valuation rules treat a null (no value reported) differently from a field missing for that year.
+"""
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from Data_Retrieval.constant_data_structures import financials_row_mapping
+from Data_Retrieval.shared_functions import get_company_industry
+
+# Statement fields read into the panel, the last axis of the value array
+PANEL_FIELDS = [
+    "totalRevenue",
+    "netIncome",
+    "netIncomeApplicableToCommonShares",
+    "commonStockSharesOutstanding",
+    "grossProfit",
+    "ebitda",
+    "ebit",
+    "operatingIncome",
+    "incomeTaxExpense",
+    "interestExpense",
+    "researchDevelopment",
+    "sellingAndMarketingExpenses",
+    "sellingGeneralAdministrative",
+    "totalCashFromOperatingActivities",
+    "freeCashFlow",
+    "changeInCash",
+    "cash",
+    "cashAndShortTermInvestments",
+    "shortTermDebt",
+    "longTermDebtTotal",
+    "shortLongTermDebtTotal",
+    "nonCurrentLiabilitiesTotal",
+    "totalCurrentAssets",
+    "totalCurrentLiabilities",
+    "totalAssets",
+    "totalLiab",
+    "intangibleAssets",
+    "goodWill",
+    "preferredStockTotalEquity",
+    "totalStockholderEquity",
+]
+FIELD_INDEX = {field: i for i, field in enumerate(PANEL_FIELDS)}
+
+# Same limit as the summarised statements, the previous 20 years
+MAX_PANEL_YEARS = 20
+
+VALUATION_METRICS = [
+    "Price",
+    "MktCap",
+    "EV",
+    "Revenue",
+    "Div Yield",
+    "Debt/Equity",
+    "P/S",
+    "EV/EBITDA",
+    "EV/EBIT",
+    "P/B",
+    "P/TB",
+    "Trailing P/E",
+    "Forward P/E",
+    "PEG 3yr",
+    "P/CFO",
+    "P/FCF",
+    "P/Div",
+    "P/Cash",
+    "P/NCash",
+    "P/NN",
+    "Interest Cov",
+    "Service Cov",
+    "Asset Cov",
+]
+
+HIGHLIGHT_PERCENT_ROWS = [
+    "Revenue Increase",
+    "Revenue Increase 3yr",
+    "Turnover Avg3",
+    "Cash Conversion Avg3",
+    "ROE Avg3",
+    "ROIC Avg3",
+    "CROIC Avg3",
+    "Gross Margin",
+    "EBITDA Margin",
+    "Net Inc Margin",
+    "CFO Margin",
+    "FCF Margin",
+    "NCF Margin",
+    "RND Margin",
+    "EPS Increase 3yr",
+    "Marketing Margin",
+    "General Margin",
+]
+
+HIGHLIGHT_ROWS = [
+    "commonStockSharesOutstanding",
+    "totalRevenue",
+    "Revenue Increase",
+    "Revenue Increase 3yr",
+    "Turnover Avg3",
+    "Cash Conversion Avg3",
+    "ROE Avg3",
+    "ROIC Avg3",
+    "CROIC Avg3",
+    "Gross Margin",
+    "EBITDA Margin",
+    "Net Inc Margin",
+    "CFO Margin",
+    "FCF Margin",
+    "NCF Margin",
+    "netIncome",
+    "Common EPS",
+    "EPS Increase 3yr",
+    "EBITDA /sh",
+    "freeCashFlow",
+    "CFO /sh",
+    "FCF /sh",
+    "RND Margin",
+    "Marketing Margin",
+    "General Margin",
+    "Assets /sh",
+    "Book /sh",
+    "Tang Book /sh",
+    "Debt Overhang",
+]
+
+
+def create_exchange_panel() -> dict:
+    """Returns an empty panel, companies are added with add_company_to_panel then stacked."""
+    return {"Companies": [], "Rows": []}
+
+
+def merge_yearly_statements(json_data: dict) -> (list, None):
+    # Each income statement year merged with the other statements of the same date, latest first
+    merged_years = []
+    try:
+        for i, (date, details) in enumerate(
+            json_data["Financials"]["Income_Statement"]["yearly"].items()
+        ):
+            merged_entry = {"date": details["date"]}
+            merged_entry.update(details)
+            for statement_type in ["Income_Statement", "Cash_Flow", "Balance_Sheet"]:
+                if date in json_data["Financials"][statement_type]["yearly"]:
+                    merged_entry.update(
+                        json_data["Financials"][statement_type]["yearly"][date]
+                    )
+
+            merged_years.append(merged_entry)
+
+            # Use previous 20 years
+            if i == MAX_PANEL_YEARS - 1:
+                break
+    except (KeyError, TypeError):
+        print("No financial data available")
+        return None
+
+    if not merged_years:
+        print("Invalid data format for ticker")
+        return None
+
+    return merged_years
+
+
+def convert_field_value(value) -> (float, bool):
+    """Converts a statement value to millions, returning (value, is_null)."""
+    if value is None or value == "" or isinstance(value, bool):
+        return np.nan, True
+
+    try:
+        return float(value) / 1000000, False
+    except (ValueError, TypeError):
+        return np.nan, True
+
+
+def convert_json_number(value) -> (float, bool):
+    if value is None or isinstance(value, bool):
+        return np.nan, True
+
+    try:
+        return float(value), False
+    except (ValueError, TypeError):
+        return np.nan, True
+
+
+def add_company_to_panel(panel: dict, json_data: dict, current_price: float) -> bool:
+    """
+    Reads a company's yearly statements and the scalars its valuation needs into the panel.
+    Returns False, leaving the panel unchanged, if the company has no usable statements.
+    """
+    merged_years = merge_yearly_statements(json_data)
+    if merged_years is None:
+        return False
+
+    # Oldest year first, like the summarised statements
+    merged_years = merged_years[::-1]
+    year_count = len(merged_years)
+    values = np.full((year_count, len(PANEL_FIELDS)), np.nan)
+    nulls = np.zeros((year_count, len(PANEL_FIELDS)), dtype=bool)
+    present = np.zeros(len(PANEL_FIELDS), dtype=bool)
+    for field, f in FIELD_INDEX.items():
+        field_values = [entry[field] for entry in merged_years if field in entry]
+        if not field_values:
+            continue
+        present[f] = True
+
+        # Nulls only stay distinct from missing values in a field reported as text, or always reported as
+        # null, otherwise the field is a float column where they are plain missing values
+        keep_nulls = any(isinstance(value, str) for value in field_values) or (
+            all(value is None for value in field_values) and len(field_values) == year_count
+        )
+        for y, entry in enumerate(merged_years):
+            if field in entry:
+                values[y, f], nulls[y, f] = convert_field_value(entry[field])
+                nulls[y, f] &= keep_nulls
+
+    general = json_data["General"]
+    highlights = json_data.get("Highlights") or {}
+
+    # Shares outstanding in millions, falling back to the latest statement
+    shares_outstanding, shares_outstanding_null = np.nan, True
+    try:
+        shares_outstanding, shares_outstanding_null = convert_field_value(
+            json_data["SharesStats"]["SharesOutstanding"]
+        )
+        if shares_outstanding_null or np.isnan(shares_outstanding):
+            f = FIELD_INDEX["commonStockSharesOutstanding"]
+            if present[f]:
+                shares_outstanding, shares_outstanding_null = values[-1, f], nulls[-1, f]
+            else:
+                shares_outstanding, shares_outstanding_null = np.nan, True
+    except (KeyError, TypeError):
+        pass
+
+    valuation = json_data.get("Valuation") or {}
+    enterprise_value = valuation.get("EnterpriseValue") if "EnterpriseValue" in valuation else None
+
+    # PEG Ratio is calculated by dividing forward EPS by the average of future period 12 month EPS estimates
+    current_date_str = str(datetime.now().date())
+    try:
+        expected_future_earnings = [
+            float(value["earningsEstimateGrowth"])
+            for period, value in json_data["Earnings"]["Trend"].items()
+            if period >= current_date_str
+            and value["earningsEstimateGrowth"] is not None
+        ]
+        earnings_growth = np.mean(expected_future_earnings) if expected_future_earnings else np.nan
+    except (KeyError, ValueError, TypeError, AttributeError):
+        earnings_growth = np.nan
+
+    panel["Companies"].append(
+        {
+            "Code": general["Code"],
+            "Exchange": general["Exchange"],
+            "Industry": get_company_industry(json_data),
+            "Dates": [entry["date"] for entry in merged_years],
+            "Price": convert_json_number(current_price),
+            "CurrentPrice": current_price,
+            "SharesOutstanding": (shares_outstanding, shares_outstanding_null),
+            # Raw values, reported as they are when used
+            "MarketCapitalization": highlights.get("MarketCapitalization") or 0,
+            "ReportedEnterpriseValue": enterprise_value,
+            "EnterpriseValue": convert_json_number(enterprise_value),
+            "HasEnterpriseValue": "EnterpriseValue" in valuation,
+            "DividendYield": highlights.get("DividendYield") or 0,
+            "EPSEstimateNextYear": convert_json_number(highlights.get("EPSEstimateNextYear")),
+            "DividendShare": convert_json_number(highlights.get("DividendShare")),
+            "EarningsGrowth": earnings_growth,
+        }
+    )
+    panel["Rows"].append((values, nulls, present))
+    return True
+
+
+def stack_exchange_panel(panel: dict) -> dict:
+    """Stacks the added companies into the contiguous ticker x year x field arrays."""
+    companies = panel.pop("Companies")
+    rows = panel.pop("Rows")
+    ticker_count = len(companies)
+    year_count = max((len(values) for values, _, _ in rows), default=0)
+
+    values = np.full((ticker_count, year_count, len(PANEL_FIELDS)), np.nan)
+    nulls = np.zeros((ticker_count, year_count, len(PANEL_FIELDS)), dtype=bool)
+    present = np.zeros((ticker_count, len(PANEL_FIELDS)), dtype=bool)
+    for t, (company_values, company_nulls, company_present) in enumerate(rows):
+        values[t, year_count - len(company_values) :] = company_values
+        nulls[t, year_count - len(company_values) :] = company_nulls
+        present[t] = company_present
+
+    def nullable_scalars(key: str) -> (np.ndarray, np.ndarray):
+        return (
+            np.array([company[key][0] for company in companies], dtype=float),
+            np.array([company[key][1] for company in companies], dtype=bool),
+        )
+
+    panel.update(
+        {
+            "Companies": companies,
+            "Values": values,
+            "Nulls": nulls,
+            "Present": present,
+            "YearCounts": np.array([len(company["Dates"]) for company in companies], dtype=int),
+            "Price": nullable_scalars("Price"),
+            "MarketCapitalization": np.array(
+                [float(company["MarketCapitalization"]) for company in companies]
+            ),
+            "EnterpriseValue": nullable_scalars("EnterpriseValue"),
+            "HasEnterpriseValue": np.array(
+                [company["HasEnterpriseValue"] for company in companies], dtype=bool
+            ),
+            "SharesOutstanding": nullable_scalars("SharesOutstanding"),
+            "EPSEstimateNextYear": nullable_scalars("EPSEstimateNextYear"),
+            "DividendShare": nullable_scalars("DividendShare"),
+            "EarningsGrowth": np.array([company["EarningsGrowth"] for company in companies]),
+        }
+    )
+    return panel
+
+
+def build_exchange_panel(companies) -> dict:
+    """Builds a stacked panel from (json_data, current_price) pairs."""
+    panel = create_exchange_panel()
+    for json_data, current_price in companies:
+        add_company_to_panel(panel, json_data, current_price)
+
+    return stack_exchange_panel(panel)
+
+
+def divide_or_none(numerator: tuple, denominator: tuple) -> tuple:
+    # handle_divide_by_zero over (values, nulls) arrays: null for a null operand or zero denominator
+    numerator_values, numerator_nulls = numerator
+    denominator_values, denominator_nulls = denominator
+    nulls = numerator_nulls | denominator_nulls | (denominator_values == 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = np.where(nulls, np.nan, numerator_values / denominator_values)
+    return values, nulls
+
+
+def subtract_or_none(left: tuple, right: tuple) -> tuple:
+    nulls = left[1] | right[1]
+    return np.where(nulls, np.nan, left[0] - right[0]), nulls
+
+
+def calculate_panel_valuations(panel: dict) -> dict:
+    """
+    Computes every valuation metric of the latest fiscal year for all companies at once.
+    Returns metric -> (values, nulls) arrays, plus the leverage inputs.
+    """
+    latest_values = panel["Values"][:, -1, :]
+    latest_nulls = panel["Nulls"][:, -1, :]
+    present = panel["Present"]
+    no_nulls = np.zeros(len(panel["Companies"]), dtype=bool)
+
+    def latest(field: str) -> tuple:
+        f = FIELD_INDEX[field]
+        return latest_values[:, f], latest_nulls[:, f]
+
+    def latest_or_zero(field: str) -> tuple:
+        # Fields a company doesn't report at all count as 0
+        f = FIELD_INDEX[field]
+        return np.where(present[:, f], latest_values[:, f], 0.0), latest_nulls[:, f] & present[:, f]
+
+    price = panel["Price"]
+    revenues = latest("totalRevenue")
+    earnings = latest("netIncome")
+    shares_outstanding = panel["SharesOutstanding"]
+
+    trailing_eps = divide_or_none(earnings, shares_outstanding)
+    # Without shares outstanding or a price the reported market cap is used
+    market_cap_from_highlights = shares_outstanding[1] | price[1]
+    market_cap = (
+        np.where(
+            market_cap_from_highlights,
+            panel["MarketCapitalization"],
+            shares_outstanding[0] * price[0],
+        ),
+        no_nulls,
+    )
+
+    total_cash = latest_or_zero("cash")
+
+    # Total debt falls back to short + long term debt when the total is null or 0, and to 0 when missing
+    debt_total, debt_total_nulls = latest("shortLongTermDebtTotal")
+    short_term_debt, short_term_debt_nulls = latest("shortTermDebt")
+    long_term_debt, long_term_debt_nulls = latest("longTermDebtTotal")
+    debt_total_present = present[:, FIELD_INDEX["shortLongTermDebtTotal"]]
+    debt_parts_usable = (
+        present[:, FIELD_INDEX["shortTermDebt"]]
+        & present[:, FIELD_INDEX["longTermDebtTotal"]]
+        & ~short_term_debt_nulls
+        & ~long_term_debt_nulls
+    )
+    total_debt_values = np.where(
+        ~debt_total_present,
+        0.0,
+        np.where(
+            ~debt_total_nulls & (debt_total != 0),
+            debt_total,
+            np.where(debt_parts_usable, short_term_debt + long_term_debt, 0.0),
+        ),
+    )
+    total_debt = (total_debt_values, no_nulls)
+
+    # Enterprise value falls back to the reported one when it comes out 0 or NaN, or market cap without a reported one
+    computed_enterprise_value = market_cap[0] + total_debt_values - total_cash[0]
+    enterprise_value_unusable = ~total_cash[1] & (
+        (computed_enterprise_value == 0) | np.isnan(computed_enterprise_value)
+    )
+    use_reported_enterprise_value = enterprise_value_unusable & panel["HasEnterpriseValue"]
+    use_market_cap = total_cash[1] | (enterprise_value_unusable & ~panel["HasEnterpriseValue"])
+    reported_enterprise_value, reported_enterprise_value_nulls = panel["EnterpriseValue"]
+    enterprise_value = (
+        np.where(
+            use_market_cap,
+            market_cap[0],
+            np.where(use_reported_enterprise_value, reported_enterprise_value, computed_enterprise_value),
+        ),
+        use_reported_enterprise_value & reported_enterprise_value_nulls,
+    )
+
+    ebitda = latest("ebitda")
+    ebit = latest("ebit")
+    trailing_price_earnings = divide_or_none(price, trailing_eps)
+    forward_price_earnings = divide_or_none(price, panel["EPSEstimateNextYear"])
+
+    earnings_growth = panel["EarningsGrowth"]
+    has_peg = (
+        ~np.isnan(earnings_growth)
+        & ~forward_price_earnings[1]
+        & (forward_price_earnings[0] != 0)
+    )
+    peg = divide_or_none(forward_price_earnings, (earnings_growth * 100, no_nulls))
+    price_earnings_growth_3yr = (np.where(has_peg, peg[0], np.nan), ~has_peg | peg[1])
+
+    # Balance Sheet
+    current_assets = latest_or_zero("totalCurrentAssets")
+    total_assets = latest_or_zero("totalAssets")
+    current_debt = latest_or_zero("shortTermDebt")
+    total_liabilities = latest_or_zero("totalLiab")
+    book_value = subtract_or_none(total_assets, total_liabilities)
+
+    intangible_assets = latest_or_zero("intangibleAssets")
+    goodwill = latest_or_zero("goodWill")
+    # Subtract what is reported, intangibles before goodwill
+    tangible_assets = (
+        np.where(
+            total_assets[1] | intangible_assets[1],
+            total_assets[0],
+            np.where(
+                goodwill[1],
+                total_assets[0] - intangible_assets[0],
+                total_assets[0] - intangible_assets[0] - goodwill[0],
+            ),
+        ),
+        total_assets[1],
+    )
+    tangible_book = subtract_or_none(tangible_assets, total_liabilities)
+    net_cash = subtract_or_none(total_cash, total_debt)
+
+    # Net net subtracts total liabilities, or preferred equity when liabilities are null
+    preferred_stock_equity = latest_or_zero("preferredStockTotalEquity")
+    net_net_liabilities = np.where(
+        total_liabilities[1],
+        np.where(preferred_stock_equity[1], 0.0, preferred_stock_equity[0]),
+        total_liabilities[0],
+    )
+    net_net = subtract_or_none(current_assets, (net_net_liabilities, no_nulls))
+
+    dividend_share = panel["DividendShare"]
+    dividend = (
+        np.where(dividend_share[1] | shares_outstanding[1], np.nan, dividend_share[0] * shares_outstanding[0]),
+        dividend_share[1] | shares_outstanding[1],
+    )
+    debt_to_equity = divide_or_none(total_liabilities, latest_or_zero("totalStockholderEquity"))
+    interest_coverage_ratio = divide_or_none(latest_or_zero("ebit"), latest_or_zero("interestExpense"))
+    asset_coverage_ratio = divide_or_none(subtract_or_none(tangible_assets, current_debt), total_debt)
+
+    return {
+        "MktCap": market_cap,
+        "EV": enterprise_value,
+        "Revenue": revenues,
+        "Debt/Equity": debt_to_equity,
+        "P/S": divide_or_none(market_cap, revenues),
+        "EV/EBITDA": divide_or_none(enterprise_value, ebitda),
+        "EV/EBIT": divide_or_none(enterprise_value, ebit),
+        "P/B": divide_or_none(market_cap, book_value),
+        "P/TB": divide_or_none(market_cap, tangible_book),
+        "Trailing P/E": trailing_price_earnings,
+        "Forward P/E": forward_price_earnings,
+        "PEG 3yr": price_earnings_growth_3yr,
+        "P/CFO": divide_or_none(market_cap, latest_or_zero("totalCashFromOperatingActivities")),
+        "P/FCF": divide_or_none(market_cap, latest_or_zero("freeCashFlow")),
+        "P/Div": divide_or_none(market_cap, dividend),
+        "P/Cash": divide_or_none(market_cap, total_cash),
+        "P/NCash": divide_or_none(market_cap, net_cash),
+        "P/NN": divide_or_none(market_cap, net_net),
+        "Interest Cov": interest_coverage_ratio,
+        "Service Cov": divide_or_none(latest("operatingIncome"), current_debt),
+        "Asset Cov": asset_coverage_ratio,
+        # Leverage inputs
+        "Total Debt": total_debt,
+        "Total Cash": total_cash,
+        # Which market cap and enterprise value companies use, to report the raw fallbacks unchanged
+        "MarketCapFromHighlights": market_cap_from_highlights,
+        "EnterpriseValueSource": np.select(
+            [use_market_cap, use_reported_enterprise_value], ["MktCap", "Reported"], "Computed"
+        ),
+    }
+
+
+def rolling_mean(values: np.ndarray) -> np.ndarray:
+    # 3 year rolling mean along the year axis for every company
+    return pd.DataFrame(values.T).rolling(window=3, min_periods=1).mean().to_numpy().T
+
+
+def pct_change(values: np.ndarray) -> np.ndarray:
+    # Change on the previous reported year, skipping over missing years
+    filled_values = pd.DataFrame(values).ffill(axis=1).to_numpy()
+    previous_values = np.full_like(filled_values, np.nan)
+    previous_values[:, 1:] = filled_values[:, :-1]
+    return filled_values / previous_values - 1
+
+
+def calculate_panel_highlights(panel: dict) -> dict:
+    """Computes every highlight row for all companies and years at once, row -> ticker x year array."""
+    present = panel["Present"]
+    # Avoid divide by 0's
+    values = np.where(panel["Values"] == 0.0, sys.float_info.epsilon, panel["Values"])
+
+    def field(name: str) -> np.ndarray:
+        return values[:, :, FIELD_INDEX[name]]
+
+    def field_or_zero(name: str) -> np.ndarray:
+        return np.where(present[:, [FIELD_INDEX[name]]], field(name), 0.0)
+
+    revenue = field("totalRevenue")
+    net_income = field("netIncome")
+    shares_outstanding = field("commonStockSharesOutstanding")
+    ebitda = field("ebitda")
+    operating_cash_flow = field("totalCashFromOperatingActivities")
+    free_cash_flow = field("freeCashFlow")
+    stockholder_equity = field_or_zero("totalStockholderEquity")
+
+    highlights = {
+        "commonStockSharesOutstanding": shares_outstanding,
+        "totalRevenue": revenue,
+        "netIncome": net_income,
+        "freeCashFlow": free_cash_flow,
+    }
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Revenue metrics
+        highlights["Revenue Increase"] = pct_change(revenue)
+        highlights["Revenue Increase 3yr"] = pct_change(rolling_mean(revenue))
+        highlights["Turnover Avg3"] = rolling_mean(net_income / revenue)
+        highlights["Cash Conversion Avg3"] = rolling_mean(operating_cash_flow / ebitda)
+
+        # Return metrics
+        highlights["ROE Avg3"] = np.where(
+            present[:, [FIELD_INDEX["totalStockholderEquity"]]],
+            net_income / rolling_mean(stockholder_equity),
+            0.0,
+        )
+        net_operating_profit_after_tax = field("ebit") - field("incomeTaxExpense")
+        invested_capital_damodaran = np.where(
+            present[:, [FIELD_INDEX["totalStockholderEquity"]]],
+            field("totalLiab") + stockholder_equity - field("cash"),
+            0.0,
+        )
+        # Companies with no invested capital in any year get no return on it
+        no_invested_capital = (invested_capital_damodaran == 0.0).any(axis=1, keepdims=True)
+        highlights["ROIC Avg3"] = np.where(
+            no_invested_capital, 0.0, rolling_mean(net_operating_profit_after_tax / invested_capital_damodaran)
+        )
+        highlights["CROIC Avg3"] = np.where(
+            no_invested_capital, 0.0, rolling_mean(free_cash_flow / invested_capital_damodaran)
+        )
+
+        # Margins
+        highlights["Gross Margin"] = field("grossProfit") / revenue
+        highlights["EBITDA Margin"] = ebitda / revenue
+        highlights["Net Inc Margin"] = net_income / revenue
+        highlights["CFO Margin"] = operating_cash_flow / revenue
+        highlights["FCF Margin"] = free_cash_flow / revenue
+        highlights["NCF Margin"] = field("changeInCash") / revenue
+
+        # Per share metrics
+        common_net_income = field("netIncomeApplicableToCommonShares")
+        highlights["Common EPS"] = (
+            np.where(np.isnan(common_net_income), net_income, common_net_income) / shares_outstanding
+        )
+        highlights["EPS Increase 3yr"] = pct_change(rolling_mean(highlights["Common EPS"]))
+        highlights["EBITDA /sh"] = ebitda / shares_outstanding
+        highlights["CFO /sh"] = operating_cash_flow / shares_outstanding
+        highlights["FCF /sh"] = free_cash_flow / shares_outstanding
+        highlights["RND Margin"] = field("researchDevelopment") / revenue
+        highlights["Marketing Margin"] = field("sellingAndMarketingExpenses") / revenue
+        highlights["General Margin"] = field("sellingGeneralAdministrative") / revenue
+
+        highlights["Assets /sh"] = field("totalAssets") / shares_outstanding
+        book_value = field("totalAssets") - field("totalLiab")
+        tangible_book = book_value - field("intangibleAssets")
+        highlights["Book /sh"] = book_value / shares_outstanding
+        highlights["Tang Book /sh"] = tangible_book / shares_outstanding
+
+    # Debt Overhang, whole millions of short term debt and non current liabilities less cash and short term investments
+    def whole_or_zero(name: str) -> np.ndarray:
+        return np.trunc(np.nan_to_num(field(name), nan=0.0))
+
+    highlights["Debt Overhang"] = (
+        whole_or_zero("shortTermDebt")
+        + whole_or_zero("nonCurrentLiabilitiesTotal")
+        - whole_or_zero("cashAndShortTermInvestments")
+    )
+
+    # Clip percent rows to bounded -1 to 1 and show them as percentages
+    for row in HIGHLIGHT_PERCENT_ROWS:
+        highlights[row] = np.clip(highlights[row], -1, 1) * 100
+
+    return highlights
+
+
+def get_company_highlights_df(panel: dict, highlights: dict, t: int) -> pd.DataFrame:
+    """Slices one company's unformatted highlights out of the panel, years as columns."""
+    year_count = panel["YearCounts"][t]
+    hl_df = pd.DataFrame(
+        [highlights[row][t, -year_count:] for row in HIGHLIGHT_ROWS],
+        index=HIGHLIGHT_ROWS,
+        columns=pd.Index(panel["Companies"][t]["Dates"], name="date"),
+        dtype=object,
+    )
+    hl_df.rename(index=financials_row_mapping, inplace=True)
+    return hl_df
+
+
+def get_company_valuation(panel: dict, valuations: dict, t: int) -> dict:
+    """Slices one company's valuation metrics out of the panel, with None where a value is missing."""
+    company = panel["Companies"][t]
+    df_dict = {
+        "Price": company["CurrentPrice"],
+        "Div Yield": company["DividendYield"],
+    }
+    for metric in VALUATION_METRICS:
+        if metric in df_dict:
+            continue
+        values, nulls = valuations[metric]
+        df_dict[metric] = None if nulls[t] else float(values[t])
+
+    # Fallbacks are reported exactly as the API gave them
+    if valuations["MarketCapFromHighlights"][t]:
+        df_dict["MktCap"] = company["MarketCapitalization"]
+    enterprise_value_source = valuations["EnterpriseValueSource"][t]
+    if enterprise_value_source == "MktCap":
+        df_dict["EV"] = df_dict["MktCap"]
+    elif enterprise_value_source == "Reported":
+        df_dict["EV"] = company["ReportedEnterpriseValue"]
+
+    # Keep the report's column order
+    return {metric: df_dict[metric] for metric in VALUATION_METRICS}
@@ -1,7 +1,7 @@
 import copy
 import json
 import os
-import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
@@ -12,7 +12,31 @@ from bokeh.layouts import column
 from bokeh.models import Div
 
 import Data_Retrieval.eodhd_apis as eodhd
-from Data_Formatting.css_styling import individual_company_table_css
+from Data_Formatting.css_styling import (
+    individual_company_stylesheet,
+    individual_company_table_css,
+    time_series_layout_css,
+)
+from Data_Formatting.html_templates import (
+    ReportAssets,
+    ReportRenderer,
+    get_report_assets,
+    get_report_renderer,
+    render_individual_company_body,
+    stream_individual_company_page,
+    write_shared_stylesheet,
+)
+from Data_Formatting.exchange_panel import (
+    HIGHLIGHT_PERCENT_ROWS,
+    add_company_to_panel,
+    build_exchange_panel,
+    calculate_panel_highlights,
+    calculate_panel_valuations,
+    create_exchange_panel,
+    get_company_highlights_df,
+    get_company_valuation,
+    stack_exchange_panel,
+)
 from Data_Retrieval.constant_data_structures import (
     financials_row_mapping,
     earnings_estimates_row_mappings,
@@ -23,24 +47,30 @@ from Data_Retrieval.constant_data_structures import (
     share_stats_row_mappings,
     share_stats_order,
 )
-from Data_Retrieval.eodhd_apis import get_tickers_by_exchange
 from Data_Retrieval.mean_std_industry_valuation import (
+    KEYS_CANT_BE_NEGATIVE,
     return_mean_std_industry_valuations,
+    return_industry_percentile_tables,
+    return_percentile_rank,
     add_company_to_valuation_list,
+    aggregate_industry_valuations,
 )
 from Data_Retrieval.shared_functions import (
     Leverage,
+    PieChartRenderer,
     convert_to_numeric_divide_by_one_million,
     format_leverage_df,
     format_rows,
     format_cell,
-    convert_none_to_zero,
-    handle_divide_by_zero,
     create_pie_chart,
-    validate_ticker,
+    create_svg_pie_chart,
+    get_pie_chart_renderer,
     convert_to_percentage,
     clean_and_round_dict,
+    validate_common_stock_tickers,
 )
+from Data_Retrieval.sector_index import return_exchange_industries, return_industry_members
+from Data_Retrieval.symbol_catalog import get_common_stock_codes, get_symbol_catalog
 
 
 def retrieve_holder_information(json_data: dict) -> None:
@@ -111,216 +141,15 @@ def create_financial_statement_df(
     return df, unformated_df, number_of_years
 
 
-def create_valuation_df(
-    json_data: dict, summarised_df: pd.DataFrame, current_price: float
-) -> (pd.DataFrame, dict):
-    # Income Statement
-    revenues = summarised_df.loc["totalRevenue"].iloc[-1]
-    earnings = summarised_df.loc["netIncome"].iloc[-1]
-    try:
-        shares_outstanding = convert_to_numeric_divide_by_one_million(
-            json_data["SharesStats"]["SharesOutstanding"]
-        )
-        if shares_outstanding is None or np.isnan(shares_outstanding):
-            shares_outstanding = summarised_df.loc["commonStockSharesOutstanding"].iloc[
-                -1
-            ]
-    except KeyError:
-        shares_outstanding = None
-
-    trailing_eps = handle_divide_by_zero(earnings, shares_outstanding)
-    try:
-        market_cap = shares_outstanding * current_price
-    except (KeyError, ValueError, TypeError):
-        market_cap = json_data["Highlights"]["MarketCapitalization"] or 0
-
-    try:
-        total_cash = summarised_df.loc["cash"].iloc[-1]
-    except KeyError:
-        total_cash = 0
-
-    try:
-        total_debt = (
-            summarised_df.loc["shortLongTermDebtTotal"].iloc[-1]
-            or summarised_df.loc["shortTermDebt"].iloc[-1]
-            + summarised_df.loc["longTermDebtTotal"].iloc[-1]
-        )
-    except (KeyError, ValueError, TypeError):
-        total_debt = 0
-
-    try:
-        enterprise_value = market_cap + total_debt - total_cash
-
-        if not enterprise_value or np.isnan(enterprise_value):
-            if "Valuation" in json_data and "EnterpriseValue" in json_data["Valuation"]:
-                enterprise_value = json_data["Valuation"]["EnterpriseValue"]
-            else:
-                enterprise_value = market_cap
-
-    except (KeyError, ValueError, TypeError):
-        enterprise_value = market_cap
-
-    ebitda = summarised_df.loc["ebitda"].iloc[-1]
-    ev_ebitda = handle_divide_by_zero(enterprise_value, ebitda)
-    ebit = summarised_df.loc["ebit"].iloc[-1]
-    ev_ebit = handle_divide_by_zero(enterprise_value, ebit)
-
-    trailing_price_earnings = handle_divide_by_zero(current_price, trailing_eps)
-    forward_eps = json_data["Highlights"]["EPSEstimateNextYear"]
-    forward_price_earnings = handle_divide_by_zero(current_price, forward_eps)
-    price_sales = handle_divide_by_zero(market_cap, revenues)
-
-    # PEG Ratio is calculated by dividing forward EPS by the average of future period 12 month EPS estimates
-    current_date_str = str(datetime.now().date())
-    try:
-        expected_future_earnings = [
-            float(value["earningsEstimateGrowth"])
-            for period, value in json_data["Earnings"]["Trend"].items()
-            if period >= current_date_str
-            and value["earningsEstimateGrowth"] is not None
-        ]
-        if expected_future_earnings and forward_price_earnings:
-            expected_average_future_earnings_growth = np.mean(expected_future_earnings)
-            price_earnings_growth_3yr = handle_divide_by_zero(
-                forward_price_earnings, (expected_average_future_earnings_growth * 100)
-            )
-        else:
-            price_earnings_growth_3yr = None
-
-    except (KeyError, ValueError, KeyError):
-        price_earnings_growth_3yr = None
-
-    # Balance Sheet
-    current_assets = summarised_df.loc["totalCurrentAssets"].iloc[-1] if "totalCurrentAssets" in summarised_df.index else 0
-    total_assets = summarised_df.loc["totalAssets"].iloc[-1] if "totalAssets" in summarised_df.index else 0
-    current_debt = summarised_df.loc["shortTermDebt"].iloc[-1] if "shortTermDebt" in summarised_df.index else 0
-    # current_liabilities = summarised_df.loc['totalCurrentLiabilities'].iloc[-1]
-    total_liabilities = summarised_df.loc["totalLiab"].iloc[-1] if "totalLiab" in summarised_df.index else 0
-    try:
-        book_value = total_assets - total_liabilities
-    except (ValueError, TypeError):
-        book_value = None
-
-    intangible_assets = summarised_df.loc["intangibleAssets"].iloc[-1] if "intangibleAssets" in summarised_df.index else 0
-    goodwill = summarised_df.loc["goodWill"].iloc[-1] if "goodWill" in summarised_df.index else 0
-    try:
-        tangible_assets = total_assets - intangible_assets - goodwill
-    except (ValueError, TypeError):
-        try:
-            tangible_assets = total_assets - intangible_assets
-        except (ValueError, TypeError):
-            tangible_assets = total_assets
-    try:
-        tangible_book = tangible_assets - total_liabilities
-    except (ValueError, TypeError):
-        tangible_book = None
-    price_tangible_book = handle_divide_by_zero(market_cap, tangible_book)
-    price_book = handle_divide_by_zero(market_cap, book_value)
-    price_cash = handle_divide_by_zero(market_cap, total_cash)
-    try:
-        net_cash = total_cash - total_debt
-    except (ValueError, TypeError):
-        net_cash = None
-    price_net_cash = handle_divide_by_zero(market_cap, net_cash)
-    preferred_stock_equity = summarised_df.loc["preferredStockTotalEquity"].iloc[-1] if "preferredStockTotalEquity" in summarised_df.index else 0
-    try:
-        net_net = current_assets - (
-            total_liabilities
-            if total_liabilities is not None
-            else 0 + preferred_stock_equity if preferred_stock_equity is not None else 0
-        )
-    except (ValueError, TypeError):
-        net_net = None
-    price_net_net = handle_divide_by_zero(market_cap, net_net)
-    debt_to_equity = handle_divide_by_zero(
-        total_liabilities, summarised_df.loc["totalStockholderEquity"].iloc[-1] if "totalStockholderEquity" in summarised_df.index else 0
-    )
-
-    # Cash Flow
-    price_operating_cash_flow = handle_divide_by_zero(
-        market_cap, summarised_df.loc["totalCashFromOperatingActivities"].iloc[-1] if "totalCashFromOperatingActivities" in summarised_df.index else 0
-    )
-    price_free_cash_flow = handle_divide_by_zero(
-        market_cap, summarised_df.loc["freeCashFlow"].iloc[-1] if "freeCashFlow" in summarised_df.index else 0
-    )
-    dividend_per_share = json_data["Highlights"]["DividendShare"]
-    dividend_yield = json_data["Highlights"]["DividendYield"] or 0
-    try:
-        dividend = dividend_per_share * shares_outstanding
-    except (ValueError, TypeError):
-        dividend = None
-    price_dividend = handle_divide_by_zero(market_cap, dividend)
-    interest_coverage_ratio = handle_divide_by_zero(
-        summarised_df.loc["ebit"].iloc[-1] if "ebit" in summarised_df.index else 0,
-        summarised_df.loc["interestExpense"].iloc[-1] if "interestExpense" in summarised_df.index else 0,
-    )
+def format_valuation_df(valuation_df: pd.DataFrame, exchange: str, industry: str) -> pd.DataFrame:
+    """
+    Colours each valuation by its percentile rank within the industry and adds the ranks as an
+    Industry Percentile row under the values.
     """
-	DSCR =  Net Operating Income / Debt Service
-	where:
-	
-	Net Operating Income = Adj. EBITDA = (Gross Operating Revenue) − (Operating Expenses)
-	Debt Service = (Principal Repayment) + (Interest Payments) + (Lease Payments)
-	"""
-    debt_service_coverage = handle_divide_by_zero(
-        summarised_df.loc["operatingIncome"].iloc[-1], current_debt
-    )
-    try:
-        asset_coverage = tangible_assets - current_debt
-    except (ValueError, TypeError):
-        asset_coverage = None
-    asset_coverage_ratio = handle_divide_by_zero(asset_coverage, total_debt)
-
-    df_dict = {
-        "Price": current_price,
-        "MktCap": market_cap,
-        "EV": enterprise_value,
-        "Revenue": revenues,
-        "Div Yield": dividend_yield,
-        "Debt/Equity": debt_to_equity,
-        "P/S": price_sales,
-        "EV/EBITDA": ev_ebitda,
-        "EV/EBIT": ev_ebit,
-        "P/B": price_book,
-        "P/TB": price_tangible_book,
-        "Trailing P/E": trailing_price_earnings,
-        "Forward P/E": forward_price_earnings,
-        "PEG 3yr": price_earnings_growth_3yr,
-        "P/CFO": price_operating_cash_flow,
-        "P/FCF": price_free_cash_flow,
-        "P/Div": price_dividend,
-        "P/Cash": price_cash,
-        "P/NCash": price_net_cash,
-        "P/NN": price_net_net,
-        "Interest Cov": interest_coverage_ratio,
-        "Service Cov": debt_service_coverage,
-        "Asset Cov": asset_coverage_ratio,
-    }
-    clean_and_round_dict(df_dict)
-    result_df = pd.DataFrame.from_dict([df_dict])
-    try:
-        result_df["Div Yield"] = round(result_df["Div Yield"] * 100, 2)
-    except (KeyError, ValueError, TypeError):
-        result_df["Div Yield"] = 0
-
-    # Copy updated information into valuation tracker to calculate industry mean and std
-    exchange = json_data["General"]["Exchange"]
-    code = json_data["General"]["Code"]
-
-    try:
-        industry = json_data["General"]["GicSector"]
-        if not industry or industry == "null":
-            industry = json_data["General"]["Sector"]
-        industry = industry.replace(" ", "_")
-    except (KeyError, AttributeError):
-        industry = "None"
-
-    update_dict = {"Code": code}
-    ordered_dict = {**update_dict, **df_dict}
-
-    add_company_to_valuation_list(ordered_dict, exchange, code, industry)
     industry_average_valuation_dict = return_mean_std_industry_valuations(
         exchange, industry
     )
+    percentile_tables = return_industry_percentile_tables(exchange, industry)
     large_positive = [
         "Revenue",
         "Div Yield",
@@ -328,37 +157,115 @@ def create_valuation_df(
         "Service Cov",
         "Asset Cov",
     ]
+    # Shown as a percentage, recorded as a fraction
+    display_scales = {"Div Yield": 100}
+
+    percentiles = {}
+    for col in valuation_df.columns:
+        value = valuation_df.at[0, col]
+        if col in KEYS_CANT_BE_NEGATIVE and isinstance(value, (int, float)) and value < 0:
+            # Negative ratios aren't recorded, ranking them first would be misleading
+            continue
+        try:
+            value = float(value) / display_scales.get(col, 1)
+        except (TypeError, ValueError):
+            continue
+        percentiles[col] = return_percentile_rank(percentile_tables.get(col), value)
 
     if industry_average_valuation_dict:
         for col, median in industry_average_valuation_dict["Median"].items():
             if col in large_positive:
                 format_cell(
-                    result_df,
+                    valuation_df,
                     col,
                     median,
                     industry_average_valuation_dict["MAD"][col],
                     red_negative=True,
+                    percentile=percentiles.get(col),
                 )
             else:
                 format_cell(
-                    result_df,
+                    valuation_df,
                     col,
                     median,
                     industry_average_valuation_dict["MAD"][col],
                     large_positive=False,
                     red_negative=True,
+                    percentile=percentiles.get(col),
                 )
 
-    leverage_df = calculate_leverage_df(
-        total_debt,
-        total_cash,
-        market_cap,
-        enterprise_value,
-        debt_to_equity,
-        interest_coverage_ratio,
-        asset_coverage_ratio,
-    )
-    return result_df, ordered_dict, leverage_df
+    percentile_row = {
+        col: "" if percentiles.get(col) is None else f"{percentiles[col] * 100:.0f}"
+        for col in valuation_df.columns
+    }
+    valuation_df = pd.concat([valuation_df, pd.DataFrame([percentile_row])], ignore_index=True)
+    valuation_df.index = ["Value", "Industry Percentile"]
+    return valuation_df
+
+
+def compute_exchange_finances(panel: dict) -> list:
+    """
+    Computes the valuation, leverage and highlights of every company in a stacked exchange panel
+    and adds them to their industries' valuations. Returns one dict per company, in panel order.
+    """
+    if not panel["Companies"]:
+        return []
+
+    valuations = calculate_panel_valuations(panel)
+    highlights = calculate_panel_highlights(panel)
+
+    computed_companies = []
+    for t, company in enumerate(panel["Companies"]):
+        df_dict = get_company_valuation(panel, valuations, t)
+        result_df = pd.DataFrame.from_dict([df_dict])
+        try:
+            result_df["Div Yield"] = round(result_df["Div Yield"] * 100, 2)
+        except (KeyError, ValueError, TypeError):
+            result_df["Div Yield"] = 0
+
+        total_debt = float(valuations["Total Debt"][0][t])
+        total_cash = None if valuations["Total Cash"][1][t] else float(valuations["Total Cash"][0][t])
+        leverage_df = calculate_leverage_df(
+            total_debt,
+            total_cash,
+            df_dict["MktCap"],
+            df_dict["EV"],
+            df_dict["Debt/Equity"],
+            df_dict["Interest Cov"],
+            df_dict["Asset Cov"],
+        )
+
+        # Copy updated information into valuation tracker to calculate industry mean and std
+        ordered_dict = {"Code": company["Code"], **df_dict}
+        add_company_to_valuation_list(
+            ordered_dict, company["Exchange"], company["Code"], company["Industry"]
+        )
+
+        computed_companies.append(
+            {
+                "Code": company["Code"],
+                "Exchange": company["Exchange"],
+                "Industry": company["Industry"],
+                "valuation_df": result_df,
+                "ordered_dict": ordered_dict,
+                "leverage_df": leverage_df,
+                "highlights_df": get_company_highlights_df(panel, highlights, t),
+            }
+        )
+
+    return computed_companies
+
+
+def return_valuation_history_rows(computed_companies: list) -> list[dict]:
+    """The rows record_valuation_history keeps for companies computed by compute_exchange_finances."""
+    return [
+        {
+            **computed["ordered_dict"],
+            "Exchange": computed["Exchange"],
+            "Industry": computed["Industry"],
+        }
+        for computed in computed_companies
+    ]
 
 
 def calculate_leverage_df(
@@ -445,221 +352,65 @@ def calculate_leverage_df(
     return leverage_df
 
 
-def calculate_industry_average(api_token: str, exchange: str, industry: str) -> None:
-    tickers = get_tickers_by_exchange(api_token, exchange)
-    computed_industry = "None"
-    for ticker in tickers:
-        company_code = ticker["Code"]
-        company_code = validate_ticker(company_code, exchange)
-        json_data = eodhd.get_fundamental_data(api_token, exchange, company_code)
-        if not validate_common_stock_tickers(json_data, company_code):
-            continue
+def calculate_industry_average(
+    api_token: str, exchange: str, industry: str, index_sectors: bool = True
+) -> None:
+    """
+    Recomputes the valuations of one industry (a GicSector, or Sector for companies without one),
+    loading only the companies the sector index lists as its members. index_sectors=False skips
+    indexing the exchange's missing companies first, for callers that already have.
+    """
+    catalog = get_symbol_catalog(api_token, exchange)
+    if not catalog:
+        return
 
-        computed_industry = json_data["General"]["GicSector"]
-        if not computed_industry or computed_industry == "null":
-            computed_industry = json_data["General"]["Sector"]
+    company_codes = get_common_stock_codes(catalog, exchange)
+    if index_sectors:
+        eodhd.index_missing_sectors(api_token, exchange, company_codes)
+    industry_members = return_industry_members(exchange, industry)
 
-        if industry != computed_industry:
+    panel = create_exchange_panel()
+    for company_code in company_codes:
+        if company_code not in industry_members:
+            continue
+
+        json_data = eodhd.get_fundamental_data(api_token, exchange, company_code)
+        if not validate_common_stock_tickers(json_data, company_code):
             continue
 
         company_price = eodhd.get_stock_close_price(api_token, exchange, company_code)
         if company_price is None:
             continue
-        summarised_df = create_summarised_df(json_data)
-        if summarised_df.empty:
-            continue
-        _, ordered_dict = create_valuation_df(json_data, summarised_df, company_price)
-        add_company_to_valuation_list(
-            ordered_dict, exchange, company_code, computed_industry
-        )
+        add_company_to_panel(panel, json_data, company_price)
 
-    return_mean_std_industry_valuations(exchange, computed_industry)
+    compute_exchange_finances(stack_exchange_panel(panel))
+    aggregate_industry_valuations(exchange, industry.replace(" ", "_"))
 
 
-def create_highlights_df(hl_df: pd.DataFrame) -> pd.DataFrame:
-    # Avoid divide by 0's
-    hl_df.fillna(sys.float_info.epsilon)
-    # hl_df.replace(0, sys.float_info.epsilon, inplace=True)
-    hl_df.replace(0.0, sys.float_info.epsilon, inplace=True)
-
-    # Revenue metrics
-    hl_df.loc["Revenue Increase"] = hl_df.loc["totalRevenue"].pct_change()
-
-    # Calculate rolling percentage increase over the past 3 cells
-    hl_df.loc["Revenue Increase 3yr"] = (
-        hl_df.loc["totalRevenue"].rolling(window=3, min_periods=1).mean().pct_change()
-    )
-
-    hl_df.loc["Turnover Avg3"] = (
-        (hl_df.loc["netIncome"] / hl_df.loc["totalRevenue"])
-        .rolling(window=3, min_periods=1)
-        .mean()
-    )
-
-    hl_df.loc["Cash Conversion Avg3"] = (
-        (hl_df.loc["totalCashFromOperatingActivities"] / hl_df.loc["ebitda"])
-        .rolling(window=3, min_periods=1)
-        .mean()
-    )
+def calculate_all_industry_averages(api_token: str, exchange: str, jobs: int = 4) -> None:
+    """Recomputes every industry on the exchange, `jobs` industries at a time."""
+    catalog = get_symbol_catalog(api_token, exchange)
+    if not catalog:
+        return
 
-    # Return metrics
-    hl_df.loc["ROE Avg3"] = (
-        hl_df.loc["netIncome"]
-        / hl_df.loc["totalStockholderEquity"].rolling(window=3, min_periods=1).mean()
-        if "totalStockholderEquity" in hl_df.index else 0
-    )
-    net_operating_profit_after_tax = hl_df.loc["ebit"] - hl_df.loc["incomeTaxExpense"]
-    non_interest_bearing_current_liabilities = (
-        hl_df.loc["totalCurrentLiabilities"] - hl_df.loc["shortTermDebt"]
-        if "totalCurrentLiabilities" in hl_df.index else 0
-    )
-    invested_capital = hl_df.loc["totalAssets"] - (
-        hl_df.loc["cash"] + non_interest_bearing_current_liabilities
-    )
-    invested_capital_damodaran = (
-        hl_df.loc["totalLiab"] + hl_df.loc["totalStockholderEquity"] - hl_df.loc["cash"]
-        if "totalStockholderEquity" in hl_df.index else 0
-    )
-    other_invested_capital = (
-        hl_df.loc["netWorkingCapital"] + hl_df.loc["propertyPlantAndEquipmentNet"]
-    )
-    if (invested_capital_damodaran == 0.0).any():
-        hl_df.loc["ROIC Avg3"] = 0
-        hl_df.loc["CROIC Avg3"] = 0
-    else:
-        hl_df.loc["ROIC Avg3"] = (
-            (net_operating_profit_after_tax / invested_capital_damodaran)
-            .rolling(window=3, min_periods=1)
-            .mean()
-        )
-        hl_df.loc["CROIC Avg3"] = (
-            (hl_df.loc["freeCashFlow"] / invested_capital_damodaran)
-            .rolling(window=3, min_periods=1)
-            .mean()
+    eodhd.index_missing_sectors(api_token, exchange, get_common_stock_codes(catalog, exchange))
+    # Load the day's prices once rather than in every worker
+    eodhd.get_bulk_close_prices(api_token, exchange)
+    industries = return_exchange_industries(exchange)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        # Consumed so an industry that fails raises here instead of being dropped silently
+        list(
+            executor.map(
+                lambda industry: calculate_industry_average(
+                    api_token, exchange, industry, index_sectors=False
+                ),
+                industries,
+            )
         )
 
-    # Margins
-    hl_df.loc["Gross Margin"] = hl_df.loc["grossProfit"] / hl_df.loc["totalRevenue"]
-    hl_df.loc["EBITDA Margin"] = hl_df.loc["ebitda"] / hl_df.loc["totalRevenue"]
-    hl_df.loc["Net Inc Margin"] = hl_df.loc["netIncome"] / hl_df.loc["totalRevenue"]
-    hl_df.loc["CFO Margin"] = (
-        hl_df.loc["totalCashFromOperatingActivities"] / hl_df.loc["totalRevenue"]
-    )
-    hl_df.loc["FCF Margin"] = hl_df.loc["freeCashFlow"] / hl_df.loc["totalRevenue"]
-    hl_df.loc["NCF Margin"] = hl_df.loc["changeInCash"] / hl_df.loc["totalRevenue"]
-
-    # Per share metrics
-    hl_df.loc["Common EPS"] = (
-        hl_df.loc["netIncomeApplicableToCommonShares"].fillna(hl_df.loc["netIncome"])
-        / hl_df.loc["commonStockSharesOutstanding"]
-    )
-    hl_df.loc["EPS Increase 3yr"] = (
-        hl_df.loc["Common EPS"].rolling(window=3, min_periods=1).mean().pct_change()
-    )
-    hl_df.loc["EBITDA /sh"] = (
-        hl_df.loc["ebitda"] / hl_df.loc["commonStockSharesOutstanding"]
-    )
-    hl_df.loc["CFO /sh"] = (
-        hl_df.loc["totalCashFromOperatingActivities"]
-        / hl_df.loc["commonStockSharesOutstanding"]
-    )
-    hl_df.loc["FCF /sh"] = (
-        hl_df.loc["freeCashFlow"] / hl_df.loc["commonStockSharesOutstanding"]
-    )
-    hl_df.loc["RND Margin"] = (
-        hl_df.loc["researchDevelopment"] / hl_df.loc["totalRevenue"]
-    )
-    hl_df.loc["Marketing Margin"] = (
-        hl_df.loc["sellingAndMarketingExpenses"] / hl_df.loc["totalRevenue"]
-    )
-    hl_df.loc["General Margin"] = (
-        hl_df.loc["sellingGeneralAdministrative"] / hl_df.loc["totalRevenue"]
-    )
-
-    hl_df.loc["Assets /sh"] = (
-        hl_df.loc["totalAssets"] / hl_df.loc["commonStockSharesOutstanding"]
-    )
-    book_value = hl_df.loc["totalAssets"] - hl_df.loc["totalLiab"]
-    tangible_book = book_value - hl_df.loc["intangibleAssets"]
-    hl_df.loc["Book /sh"] = book_value / hl_df.loc["commonStockSharesOutstanding"]
-    hl_df.loc["Tang Book /sh"] = (
-        tangible_book / hl_df.loc["commonStockSharesOutstanding"]
-    )
 
-    # Calculate 'Debt Overhang' by subtracting 'cashAndShortTermInvestments' from the sum of the other two
-    highlight_values = hl_df.loc[
-        ["shortTermDebt", "nonCurrentLiabilitiesTotal", "cashAndShortTermInvestments"]
-    ]
-    highlight_values = highlight_values.applymap(convert_none_to_zero)
-    hl_df.loc["Debt Overhang"] = (
-        highlight_values.loc["shortTermDebt"]
-        + highlight_values.loc["nonCurrentLiabilitiesTotal"]
-        - highlight_values.loc["cashAndShortTermInvestments"]
-    )
-
-    percent_columns = [
-        "Revenue Increase",
-        "Revenue Increase 3yr",
-        "Turnover Avg3",
-        "Cash Conversion Avg3",
-        "ROE Avg3",
-        "ROIC Avg3",
-        "CROIC Avg3",
-        "Gross Margin",
-        "EBITDA Margin",
-        "Net Inc Margin",
-        "CFO Margin",
-        "FCF Margin",
-        "NCF Margin",
-        "RND Margin",
-        "EPS Increase 3yr",
-        "Marketing Margin",
-        "General Margin",
-    ]
-
-    # Clip percent rows to bounded -1 to 1 (could improve this to be > < a exponential)
-    for column in percent_columns:
-        hl_df.loc[column] = hl_df.loc[column].clip(lower=-1, upper=1)
-
-    # Multiply selected rows by 100
-    hl_df.loc[percent_columns] *= 100
-
-    # Reorder the DataFrame columns
-    new_order = [
-        "commonStockSharesOutstanding",
-        "totalRevenue",
-        "Revenue Increase",
-        "Revenue Increase 3yr",
-        "Turnover Avg3",
-        "Cash Conversion Avg3",
-        "ROE Avg3",
-        "ROIC Avg3",
-        "CROIC Avg3",
-        "Gross Margin",
-        "EBITDA Margin",
-        "Net Inc Margin",
-        "CFO Margin",
-        "FCF Margin",
-        "NCF Margin",
-        "netIncome",
-        "Common EPS",
-        "EPS Increase 3yr",
-        "EBITDA /sh",
-        "freeCashFlow",
-        "CFO /sh",
-        "FCF /sh",
-        "RND Margin",
-        "Marketing Margin",
-        "General Margin",
-        "Assets /sh",
-        "Book /sh",
-        "Tang Book /sh",
-        "Debt Overhang",
-    ]
-    hl_df = hl_df.reindex(new_order)
-
-    # Rename the rows
-    hl_df.rename(index=financials_row_mapping, inplace=True)
+def format_highlights_df(hl_df: pd.DataFrame) -> pd.DataFrame:
+    percent_columns = HIGHLIGHT_PERCENT_ROWS
     hl_df = hl_df.fillna("")
 
     # List of rows to round and format as integers (greater than mean = green)
@@ -728,6 +479,19 @@ def create_highlights_df(hl_df: pd.DataFrame) -> pd.DataFrame:
     return hl_df
 
 
+def create_balance_sheet_pie_chart(
+    latest_data: pd.DataFrame, components: list[str], title: str
+) -> (str, None):
+    if get_pie_chart_renderer() == PieChartRenderer.svg:
+        return create_svg_pie_chart(latest_data, components, title)
+
+    pie_chart = create_pie_chart(latest_data, components)
+    if pie_chart is None:
+        return None
+
+    return f"""<img src="data:image/png;base64,{pie_chart}" alt='{title}' style="width: 100%;">"""
+
+
 def create_balance_sheet_pie_charts(balance_sheet_df: pd.DataFrame) -> str:
     latest_data = balance_sheet_df.iloc[:, -1:]
     asset_components = [
@@ -740,7 +504,9 @@ def create_balance_sheet_pie_charts(balance_sheet_df: pd.DataFrame) -> str:
         "Goodwill",
         "Non-Current Assets Other",
     ]
-    asset_pie_chart = create_pie_chart(latest_data, asset_components)
+    asset_pie_chart = create_balance_sheet_pie_chart(
+        latest_data, asset_components, "Total Assets Pie Chart"
+    )
 
     liability_components = [
         "Short-Term Debt",
@@ -751,7 +517,9 @@ def create_balance_sheet_pie_charts(balance_sheet_df: pd.DataFrame) -> str:
         "Capital Lease Obligations",
         "Deferred Long-Term Liabilities",
     ]
-    liability_pie_chart = create_pie_chart(latest_data, liability_components)
+    liability_pie_chart = create_balance_sheet_pie_chart(
+        latest_data, liability_components, "Total Liabilities Pie Chart"
+    )
 
     # HTML content with side-by-side charts
     html_content = """
@@ -761,14 +529,14 @@ def create_balance_sheet_pie_charts(balance_sheet_df: pd.DataFrame) -> str:
         html_content += f"""
 	        <div style="text-align: center;">
 	            <h2>Total Assets Composition Pie Chart</h2>
-	            <img src="data:image/png;base64,{asset_pie_chart}" alt='Total Assets Pie Chart' style="width: 100%;">
+	            {asset_pie_chart}
 	        </div>
 	    """
     if liability_pie_chart is not None:
         html_content += f"""
 	        <div style="text-align: center;">
 	            <h2>Total Liabilities Composition Pie Chart</h2>
-	            <img src="data:image/png;base64,{liability_pie_chart}" alt='Total Liabilities Pie Chart' style="width: 100%;">
+	            {liability_pie_chart}
 	        </div>
 	    """
     html_content += """
@@ -894,66 +662,36 @@ def create_share_statistics_df(json_data: dict) -> pd.DataFrame:
     return share_stats_df
 
 
-def create_summarised_df(json_data: dict) -> (pd.DataFrame, None):
-    summarised_flattened_data = []
-
-    try:
-        for i, (date, details) in enumerate(
-            json_data["Financials"]["Income_Statement"]["yearly"].items()
-        ):
-            summarised_entry = {"date": details["date"]}
-            summarised_entry.update(details)
-
-            # Add details from other financial statements for the corresponding date
-            for statement_type in ["Income_Statement", "Cash_Flow", "Balance_Sheet"]:
-                if date in json_data["Financials"][statement_type]["yearly"]:
-                    summarised_entry.update(
-                        json_data["Financials"][statement_type]["yearly"][date]
-                    )
-
-            summarised_flattened_data.append(summarised_entry)
-
-            # Use previous 20 years
-            if i == 19:
-                break
-    except KeyError:
-        print("No financial data available")
-        return pd.DataFrame()
-
-    summarised_df = pd.DataFrame(summarised_flattened_data)
-
-    # Set the "date" column as the index
-    try:
-        summarised_df.set_index("date", inplace=True)
-    except KeyError:
-        print("Invalid data format for ticker")
-        return pd.DataFrame()
-
-    # Transpose and invert the DataFrame
-    summarised_df = summarised_df.T.iloc[:, ::-1]
-
-    # Convert strings to numbers and divide by 1 million
-    numeric_columns = summarised_df.columns.difference(["date"])
-    summarised_df[numeric_columns] = summarised_df[numeric_columns].applymap(
-        convert_to_numeric_divide_by_one_million
-    )
+def compute_individual_finances(json_data: dict, current_price: float) -> (dict, None):
+    """
+    Computes the valuation, leverage and highlights of a company and adds it to its industry's
+    valuations, without formatting anything against the industry statistics yet.
+    """
+    panel = build_exchange_panel([(json_data, current_price)])
+    if not panel["Companies"]:
+        return None
 
-    return summarised_df
+    return compute_exchange_finances(panel)[0]
 
 
 def print_individual_finances(json_data: dict, current_price: float) -> None:
-    summarised_df = create_summarised_df(json_data)
-
-    if summarised_df.empty:
+    computed_finances = compute_individual_finances(json_data, current_price)
+    if computed_finances is None:
         return
 
-    # Create valuation df based off summarised_df
-    valuation_df, _, levereage_df = create_valuation_df(
-        json_data, summarised_df, current_price
+    render_individual_finances(json_data, computed_finances)
+
+
+def render_individual_finances(json_data: dict, computed_finances: dict) -> None:
+    """Formats a company computed by compute_individual_finances against its industry and saves the html."""
+    levereage_df = computed_finances["leverage_df"]
+    valuation_df = format_valuation_df(
+        computed_finances["valuation_df"].copy(),
+        computed_finances["Exchange"],
+        computed_finances["Industry"],
     )
 
-    # Create highlights df based off summarised_df
-    hl_df = create_highlights_df(summarised_df)
+    hl_df = format_highlights_df(computed_finances["highlights_df"].copy())
 
     # Access the DataFrames for each financial statement
     financial_statements = {
@@ -1023,58 +761,43 @@ def print_individual_finances(json_data: dict, current_price: float) -> None:
         align = ' style="text-align: center; "'
     company_name = json_data["General"]["Name"]
 
-    # Combine all dataframes into one
-    combined_html = (
-        summary_df.to_html(col_space=summary_col_widths, index=False, na_rep="N/A")
-        + "<br>"
-        + f"<h2>{company_name} Valuation</h2>"
-        + valuation_df.to_html(
-            classes="valuation-table", index=False, escape=False, na_rep="N/A"
-        )
-        + "<br>"
-        + f"<h2{align}>{company_name} Summary</h2>"
-        + hl_df.to_html(
+    context = {
+        "company_name": company_name,
+        "align": align,
+        "summary_table": summary_df.to_html(
+            col_space=summary_col_widths, index=False, na_rep="N/A"
+        ),
+        "valuation_table": valuation_df.to_html(
+            classes="valuation-table", escape=False, na_rep="N/A"
+        ),
+        "highlights_table": hl_df.to_html(
             classes="highlight-table time-series", escape=False, na_rep="N/A"
-        )
-    )
-
-    if not earnings_estimates_df.empty:
-        combined_html += (
-            f"<h2{align}>Future Earnings Estimates</h2>"
-            + earnings_estimates_df.to_html(classes="short-table", escape=False)
-        )
-
-    if not share_stats_df.empty:
-        combined_html += f"<h2{align}>Share Statistics</h2>" + share_stats_df.to_html(
-            index=False, classes="short-table", escape=False
-        )
-
-    combined_html += f"<h2{align}>Leverage Ratios</h2>" + levereage_df.to_html(
-        classes="medium-table", index=False, escape=False
-    )
-
-    for df, title in zip(financial_statement_dataframes, financial_statements.keys()):
-        classes = title + "-table time-series"
-        if title == "Balance_Sheet":
-            combined_html += (
-                f"<br><h2{align}>{title.replace('_', ' ')}</h2>"
-                + df.to_html(classes=classes, escape=False, na_rep="N/A")
-                + html_pie_charts
-            )
-        else:
-            combined_html += (
-                f"<br><h2{align}>{title.replace('_', ' ')}</h2>"
-                + df.to_html(classes=classes, escape=False, na_rep="N/A")
-            )
-
-    # Display the DataFrame in a Bokeh Div widget
-    div_widget = Div(
-        text=individual_company_table_css(number_of_years) + combined_html,
-        width=1500,
-        height=900,
-    )
+        ),
+        "earnings_estimates_table": (
+            earnings_estimates_df.to_html(classes="short-table", escape=False)
+            if not earnings_estimates_df.empty
+            else ""
+        ),
+        "share_statistics_table": (
+            share_stats_df.to_html(index=False, classes="short-table", escape=False)
+            if not share_stats_df.empty
+            else ""
+        ),
+        "leverage_table": levereage_df.to_html(
+            classes="medium-table", index=False, escape=False
+        ),
+        "financial_statements": [
+            {
+                "title": title.replace("_", " "),
+                "table": df.to_html(
+                    classes=title + "-table time-series", escape=False, na_rep="N/A"
+                ),
+                "charts": html_pie_charts if title == "Balance_Sheet" else "",
+            }
+            for df, title in zip(financial_statement_dataframes, financial_statements.keys())
+        ],
+    }
 
-    # Save the layout containing the Div widget
     ticker_code = summary_df.iloc[0, 0]
     exchange = summary_df.iloc[0, 3]
 
@@ -1095,14 +818,28 @@ def print_individual_finances(json_data: dict, current_price: float) -> None:
         os.path.dirname(script_dir),
         f"Data_Output/Individual/{str(exchange)}/{str(ticker_code)}.html",
     )
-    output_file(file_location)
-    try:
-        save(column(div_widget))
-    except FileNotFoundError:
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        path = os.path.join(
-            os.path.dirname(script_dir), f"Data_Output/Individual/{str(exchange)}"
+
+    if get_report_assets() == ReportAssets.shared:
+        stylesheet = write_shared_stylesheet(
+            os.path.dirname(file_location), individual_company_stylesheet()
+        )
+        context["css"] = f'<link rel="stylesheet" href="{stylesheet}">' + time_series_layout_css(
+            number_of_years
+        )
+    else:
+        context["css"] = individual_company_table_css(number_of_years)
+
+    if get_report_renderer() == ReportRenderer.bokeh:
+        # Display the page body in a Bokeh Div widget
+        div_widget = Div(
+            text=context["css"] + render_individual_company_body(context),
+            width=1500,
+            height=900,
         )
-        os.makedirs(path)
+        os.makedirs(os.path.dirname(file_location), exist_ok=True)
+        output_file(file_location)
+        save(column(div_widget))
+    else:
+        stream_individual_company_page(context, file_location)
 
     print(f"Company formatted html has been saved to {file_location}")
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import threading
+from enum import Enum
+
+from jinja2 import DictLoader, Environment
+
+
+class ReportRenderer(Enum):
+    # Streams the page straight to disk from the templates below
+    template = "template"
+    # Wraps the same page body in a Bokeh Div saved with bokeh.io.save
+    bokeh = "bokeh"
+
+
+class ReportAssets(Enum):
+    # Every report carries its own copy of the stylesheet
+    inline = "inline"
+    # One versioned stylesheet per output directory, linked from every report in it
+    shared = "shared"
+
+
+# Relative to the reports' directory, so the reports and their assets can be moved together
+REPORT_ASSETS_DIRECTORY = "assets"
+
+# The tables are already html, so nothing is escaped. Whitespace control keeps the body byte for
+# byte what the Bokeh Div was given before the templates
+INDIVIDUAL_COMPANY_BODY = """
+{{- summary_table }}<br><h2>{{ company_name }} Valuation</h2>{{ valuation_table }}<br>
+{{- '' }}<h2{{ align }}>{{ company_name }} Summary</h2>{{ highlights_table }}
+{%- if earnings_estimates_table %}<h2{{ align }}>Future Earnings Estimates</h2>{{ earnings_estimates_table }}{% endif %}
+{%- if share_statistics_table %}<h2{{ align }}>Share Statistics</h2>{{ share_statistics_table }}{% endif %}
+{{- '' }}<h2{{ align }}>Leverage Ratios</h2>{{ leverage_table }}
+{%- for statement in financial_statements %}<br><h2{{ align }}>{{ statement.title }}</h2>{{ statement.table }}{{ statement.charts }}{% endfor %}
+"""
+
+INDIVIDUAL_COMPANY_PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{{ company_name }}</title>
+</head>
+<body>
+<div style="width: 1500px;">
+{{ css }}{% include "individual_company_body.html" %}
+</div>
+</body>
+</html>
+"""
+
+# Compiled once when the module is imported, every report reuses the compiled templates
+template_environment = Environment(
+    loader=DictLoader(
+        {
+            "individual_company_body.html": INDIVIDUAL_COMPANY_BODY,
+            "individual_company_page.html": INDIVIDUAL_COMPANY_PAGE,
+        }
+    ),
+    autoescape=False,
+)
+individual_company_body_template = template_environment.get_template("individual_company_body.html")
+individual_company_page_template = template_environment.get_template("individual_company_page.html")
+
+# Stylesheets already on disk, so an exchange run checks the file system once per directory
+written_stylesheets = set()
+written_stylesheets_lock = threading.Lock()
+
+
+def get_report_renderer() -> ReportRenderer:
+    return ReportRenderer(os.getenv("report_renderer", ReportRenderer.template.value))
+
+
+def get_report_assets() -> ReportAssets:
+    return ReportAssets(os.getenv("report_assets", ReportAssets.inline.value))
+
+
+def write_shared_stylesheet(output_directory: str, stylesheet: str) -> str:
+    """
+    Writes the stylesheet to the output directory's assets unless it is already there and returns
+    its path relative to the directory. The file is named by a hash of its content, so reports
+    never link to a stylesheet written by a different version of the code.
+    """
+    version = hashlib.sha256(stylesheet.encode("utf-8")).hexdigest()[:12]
+    relative_path = f"{REPORT_ASSETS_DIRECTORY}/individual_company-{version}.css"
+    file_path = os.path.join(output_directory, relative_path)
+    with written_stylesheets_lock:
+        if file_path not in written_stylesheets:
+            if not os.path.exists(file_path):
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                # Written under a temporary name first so a browser never loads half a stylesheet
+                temporary_path = f"{file_path}.{os.getpid()}.tmp"
+                with open(temporary_path, "w", encoding="utf-8") as file:
+                    file.write(stylesheet)
+                os.replace(temporary_path, file_path)
+            written_stylesheets.add(file_path)
+
+    return relative_path
+
+
+def render_individual_company_body(context: dict) -> str:
+    return individual_company_body_template.render(context)
+
+
+def stream_individual_company_page(context: dict, file_location: str) -> None:
+    """Writes the page to file_location as the template renders it, without building it in memory."""
+    os.makedirs(os.path.dirname(file_location), exist_ok=True)
+    individual_company_page_template.stream(context).dump(file_location, encoding="utf-8")
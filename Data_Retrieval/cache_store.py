@@ -0,0 +1,179 @@
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO
+from enum import Enum
+from typing import Callable
+
+from Data_Retrieval.json_decoding import decode_json
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class CacheBackend(Enum):
+    json = "json"
+    sqlite = "sqlite"
+
+
+class CacheDataType(Enum):
+    tickers = "tickers"
+    fundamentals = "fundamentals"
+    prices = "prices"
+
+
+# How long cached data is used before it is fetched again, overridable with e.g. fundamentals_max_age_hours
+DEFAULT_CACHE_MAX_AGE_HOURS = {
+    CacheDataType.tickers: 7 * 24,
+    CacheDataType.fundamentals: 90 * 24,
+    CacheDataType.prices: 12,
+}
+# Companies whose data hadn't changed for longer than the max age when fetched are refetched this much less often
+QUIET_COMPANY_MAX_AGE_FACTOR = 2
+
+# Open store connections keyed by store path, shared between fetch threads
+store_connections = {}
+store_locks = {}
+store_connections_lock = threading.Lock()
+
+
+def get_fundamentals_cache_backend() -> CacheBackend:
+    # Read when used rather than at import so values loaded from .env are picked up
+    return CacheBackend(os.getenv("fundamentals_cache_backend", CacheBackend.json.value))
+
+
+def get_cache_max_age(data_type: CacheDataType) -> timedelta:
+    max_age_hours = os.getenv(
+        f"{data_type.value}_max_age_hours", DEFAULT_CACHE_MAX_AGE_HOURS[data_type]
+    )
+    return timedelta(hours=float(max_age_hours))
+
+
+def split_store_path(file_path: str) -> (str, str):
+    """
+    Maps a JSON cache path onto the store that replaces its directory and the key within it,
+    e.g. Data/Fundamentals/AU/BHP.json -> (Data/Fundamentals/AU.sqlite, BHP).
+    """
+    directory, file_name = os.path.split(file_path)
+    return f"{directory}.sqlite", os.path.splitext(file_name)[0]
+
+
+def get_store_connection(store_path: str) -> (sqlite3.Connection, threading.Lock):
+    with store_connections_lock:
+        if store_path not in store_connections:
+            os.makedirs(os.path.dirname(store_path), exist_ok=True)
+            connection = sqlite3.connect(store_path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS documents (
+                    key TEXT PRIMARY KEY,
+                    codec TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    payload BLOB NOT NULL
+                )
+                """
+            )
+            connection.commit()
+            store_connections[store_path] = connection
+            store_locks[store_path] = threading.Lock()
+
+        return store_connections[store_path], store_locks[store_path]
+
+
+def compress_json(json_data) -> (str, bytes):
+    raw = json.dumps(json_data, separators=(",", ":")).encode("utf-8")
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(raw)
+
+    return "gzip", gzip.compress(raw, compresslevel=6)
+
+
+def decompress_json(codec: str, payload: bytes, decoder: Callable = decode_json):
+    # Decompress as a stream so streaming decoders never hold the whole document
+    if codec == "zstd":
+        json_file = zstandard.ZstdDecompressor().stream_reader(BytesIO(payload))
+    else:
+        json_file = gzip.GzipFile(fileobj=BytesIO(payload))
+
+    with json_file:
+        return decoder(json_file)
+
+
+def write_store_json(json_data, file_path: str, fetched_at: float | None = None) -> None:
+    store_path, key = split_store_path(file_path)
+    codec, payload = compress_json(json_data)
+    connection, lock = get_store_connection(store_path)
+    with lock:
+        connection.execute(
+            "INSERT OR REPLACE INTO documents (key, codec, fetched_at, payload) VALUES (?, ?, ?, ?)",
+            (key, codec, fetched_at or time.time(), payload),
+        )
+        connection.commit()
+
+    print(f'JSON data has been saved to "{store_path}" ({key})')
+
+
+def store_json_fetched_at(file_path: str) -> float | None:
+    store_path, key = split_store_path(file_path)
+    connection, lock = get_store_connection(store_path)
+    with lock:
+        row = connection.execute(
+            "SELECT fetched_at FROM documents WHERE key = ?", (key,)
+        ).fetchone()
+
+    if row is not None:
+        return row[0]
+
+    # Not migrated into the store yet
+    if os.path.exists(file_path):
+        return os.path.getmtime(file_path)
+
+    return None
+
+
+def read_store_json(file_path: str, decoder: Callable = decode_json):
+    """
+    Returns the cached document, or None if it isn't in the store. Documents still cached as
+    plain JSON files at file_path are moved into the store the first time they are read.
+    """
+    store_path, key = split_store_path(file_path)
+    connection, lock = get_store_connection(store_path)
+    with lock:
+        row = connection.execute(
+            "SELECT codec, payload FROM documents WHERE key = ?", (key,)
+        ).fetchone()
+
+    if row is not None:
+        return decompress_json(*row, decoder)
+
+    if not os.path.exists(file_path):
+        return None
+
+    try:
+        # Migrate the whole document, whatever decoder the caller reads with
+        with open(file_path, "rb") as json_file:
+            json_data = decode_json(json_file)
+    except FileNotFoundError:
+        # Another thread moved it into the store in the meantime
+        return read_store_json(file_path, decoder)
+    except json.JSONDecodeError as e:
+        print(f"Error decoding JSON in {file_path}: {e}")
+        return None
+
+    write_store_json(json_data, file_path, fetched_at=os.path.getmtime(file_path))
+    try:
+        # The store now holds the document, keeping the file would only store it twice
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Failed to remove {file_path} after moving it into the store. Reason: {e}")
+
+    return json_data
@@ -288,3 +288,16 @@ earnings_estimates_order = [
     "revenueEstimateGrowth",
     "revenueEstimateNumberOfAnalysts",
 ]
+
+# Sections of the fundamentals document read by the reports, in the API's filter syntax
+fundamentals_report_sections = [
+    "General",
+    "Highlights",
+    "SharesStats",
+    "Valuation",
+    "Earnings::Trend",
+    "outstandingShares",
+    "Financials::Income_Statement::yearly",
+    "Financials::Cash_Flow::yearly",
+    "Financials::Balance_Sheet::yearly",
+]
@@ -1,40 +1,121 @@
 import os
-
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
+from typing import Iterable, Iterator
+
+from Data_Retrieval.cache_store import (
+    CacheDataType,
+    get_cache_max_age,
+    get_fundamentals_cache_backend,
+)
+from Data_Retrieval.constant_data_structures import fundamentals_report_sections
+from Data_Retrieval.json_decoding import decode_fundamentals
+from Data_Retrieval.sector_index import (
+    index_company_sector,
+    index_unclassified_company,
+    is_classifiable,
+    return_indexed_codes,
+)
+from Data_Retrieval.shared_functions import (
+    RateLimiter,
+    configure_http_session,
+    get_cached_json_fetched_at,
+    is_updated_since,
+    read_cached_json,
+    request_json,
+    save_response_to_file,
+    write_cached_json,
+)
+
+EODHD_BASE_URL = "https://eodhd.com/api"
+BULK_FUNDAMENTALS_PAGE_SIZE = 500
+# The Source of documents converted from the bulk fundamentals, which lack most of the history
+BULK_FUNDAMENTALS_SOURCE = "bulk"
+
+# Close prices from the bulk end of day files, keyed by (exchange_code, date) -> {ticker_code: close}
+bulk_close_prices_index = {}
 
-from Data_Retrieval.shared_functions import save_response_to_file
+
+def get_eodhd_base_url() -> str:
+    # eodhd_base_url points the APIs at another server, e.g. the local stand in server
+    return os.getenv("eodhd_base_url", EODHD_BASE_URL).rstrip("/")
 
 
 def get_exchange_data(api_token: str) -> dict:
-    url = f"https://eodhd.com/api/exchanges-list/?api_token={api_token}&fmt=json"
+    url = f"{get_eodhd_base_url()}/exchanges-list/?api_token={api_token}&fmt=json"
     script_dir = os.path.dirname(os.path.abspath(__file__))
     file_path = os.path.join(os.path.dirname(script_dir), "Data/exchanges.json")
     return save_response_to_file(url, file_path)
 
 
 def get_tickers_by_exchange(api_token: str, exchange_code: str, override: bool = False) -> dict:
-    url = f"https://eodhd.com/api/exchange-symbol-list/{exchange_code}?api_token={api_token}&fmt=json"
+    url = f"{get_eodhd_base_url()}/exchange-symbol-list/{exchange_code}?api_token={api_token}&fmt=json"
+    file_path = get_tickers_file_path(exchange_code)
+    return save_response_to_file(
+        url, file_path, override, max_age=get_cache_max_age(CacheDataType.tickers)
+    )
+
+
+def get_tickers_file_path(exchange_code: str) -> str:
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(
+    return os.path.join(
         os.path.dirname(script_dir),
-        f"Data/Tickers/{datetime.now().year}/tickers_{exchange_code}.json",
+        f"Data/Tickers/tickers_{exchange_code}.json",
     )
-    return save_response_to_file(url, file_path, override)
 
 
 def get_end_of_day_data(api_token: str, exchange_code: str, ticker_code: str) -> dict:
-    url = f"https://eodhd.com/api/eod/{ticker_code}.{exchange_code}?api_token={api_token}&fmt=json"
+    url = f"{get_eodhd_base_url()}/eod/{ticker_code}.{exchange_code}?api_token={api_token}&fmt=json"
     script_dir = os.path.dirname(os.path.abspath(__file__))
     file_path = os.path.join(
         os.path.dirname(script_dir),
         f"Data/EOD/Date/{exchange_code}/{datetime.now().day}.{datetime.now().month}.{datetime.now().year}/{ticker_code}.json",
     )
-    return save_response_to_file(url, file_path)
+    return save_response_to_file(
+        url, file_path, max_age=get_cache_max_age(CacheDataType.prices)
+    )
+
+
+def get_bulk_end_of_day_data(api_token: str, exchange_code: str, override: bool = False) -> list:
+    url = f"{get_eodhd_base_url()}/eod-bulk-last-day/{exchange_code}?api_token={api_token}&fmt=json"
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    file_path = os.path.join(
+        os.path.dirname(script_dir),
+        f"Data/EOD/Bulk/{exchange_code}/{datetime.now().day}.{datetime.now().month}.{datetime.now().year}.json",
+    )
+    return save_response_to_file(
+        url, file_path, override, max_age=get_cache_max_age(CacheDataType.prices)
+    )
+
+
+def get_bulk_close_prices(api_token: str, exchange_code: str) -> dict:
+    """
+    Returns {ticker_code: close} for every symbol on the exchange, from a single bulk
+    last day request that is cached once per exchange per day.
+    """
+    index_key = (exchange_code, datetime.now().date())
+    if index_key not in bulk_close_prices_index:
+        bulk_data = get_bulk_end_of_day_data(api_token, exchange_code)
+        if not bulk_data:
+            print(f"Failed to retrieve bulk end of day prices: {exchange_code}")
+            return {}
+
+        close_prices = {}
+        for record in bulk_data:
+            try:
+                close_prices[record["code"]] = float(record["close"])
+            except (KeyError, ValueError, TypeError):
+                continue
+
+        bulk_close_prices_index[index_key] = close_prices
+
+    return bulk_close_prices_index[index_key]
 
 
 # This isn't available under the Fundumental plan anymore...
 def get_real_time_data(api_token: str, exchange_code: str, ticker_code: str) -> dict:
-    url = f"https://eodhd.com/api/real-time/{ticker_code}.{exchange_code}?api_token={api_token}&fmt=json"
+    url = f"{get_eodhd_base_url()}/real-time/{ticker_code}.{exchange_code}?api_token={api_token}&fmt=json"
     ticker_code = adjust_ticker_codes(ticker_code)
     script_dir = os.path.dirname(os.path.abspath(__file__))
     file_path = os.path.join(
@@ -44,27 +125,280 @@ def get_real_time_data(api_token: str, exchange_code: str, ticker_code: str) ->
     return save_response_to_file(url, file_path)
 
 
-def get_fundamental_data(api_token: str, exchange_code: str, ticker_code: str, override: bool = False) -> dict:
-    url = f"https://eodhd.com/api/fundamentals/{ticker_code}.{exchange_code}?api_token={api_token}&fmt=json"
+def get_fundamental_data(
+    api_token: str,
+    exchange_code: str,
+    ticker_code: str,
+    override: bool = False,
+    rate_limiter: RateLimiter | None = None,
+    sections_only: bool = False,
+) -> dict:
+    """
+    sections_only requests just the sections the reports read (see fundamentals_report_sections)
+    and caches them separately from full documents. The sections_only cache can also hold
+    documents written by cache_bulk_fundamental_data, which are served like any other until
+    max_age although they have fewer years and no outstandingShares.
+    """
+    url = f"{get_eodhd_base_url()}/fundamentals/{ticker_code}.{exchange_code}?api_token={api_token}&fmt=json"
+    file_path = get_fundamentals_file_path(exchange_code, ticker_code, sections_only)
+    backend = get_fundamentals_cache_backend()
+    max_age = get_cache_max_age(CacheDataType.fundamentals)
+
+    def index_sector(json_data: dict) -> None:
+        index_company_sector(exchange_code, ticker_code, json_data)
+
+    if sections_only:
+        url += f"&filter={','.join(fundamentals_report_sections)}"
+        return save_response_to_file(
+            url,
+            file_path,
+            override,
+            rate_limiter,
+            nest_filtered_fundamentals,
+            backend,
+            max_age,
+            decode_fundamentals,
+            index_sector,
+        )
+
+    return save_response_to_file(
+        url,
+        file_path,
+        override,
+        rate_limiter,
+        backend=backend,
+        max_age=max_age,
+        decoder=decode_fundamentals,
+        on_write=index_sector,
+    )
+
+
+def read_cached_fundamental_data(
+    exchange_code: str, ticker_code: str, sections_only: bool = False
+) -> dict | None:
+    """Returns the fundamentals get_fundamental_data last cached, never fetching, None if there are none."""
+    file_path = get_fundamentals_file_path(exchange_code, ticker_code, sections_only)
+    return read_cached_json(file_path, get_fundamentals_cache_backend(), decode_fundamentals)
+
+
+def is_bulk_fundamentals(json_data) -> bool:
+    return isinstance(json_data, dict) and json_data.get("Source") == BULK_FUNDAMENTALS_SOURCE
+
+
+def get_fundamentals_file_path(
+    exchange_code: str, ticker_code: str, sections_only: bool = False
+) -> str:
     ticker_code = adjust_ticker_codes(ticker_code)
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(
+    sections_directory = "Sections/" if sections_only else ""
+    return os.path.join(
         os.path.dirname(script_dir),
-        f"Data/Fundamentals/{exchange_code}/{datetime.now().year}/{ticker_code}.json",
+        f"Data/Fundamentals/{exchange_code}/{sections_directory}{ticker_code}.json",
     )
-    return save_response_to_file(url, file_path, override)
+
+
+def cache_bulk_fundamental_data(
+    api_token: str,
+    exchange_code: str,
+    override: bool = False,
+    page_size: int = BULK_FUNDAMENTALS_PAGE_SIZE,
+) -> int:
+    """
+    Pages through the bulk fundamentals endpoint and splits each company into the sections_only
+    cache, indexing its sector, so a following exchange run reads the companies from disk. The
+    documents only hold the bulk endpoint's few years of statements, SharesStats rebuilt from the
+    balance sheet and no outstandingShares (see convert_bulk_fundamentals).
+
+    Only companies without a cached document are filled. A single ticker document is never
+    replaced, a bulk one only if EODHD updated the company after it was fetched (or, without an
+    UpdatedAt, once it is older than max_age) or override is set. Returns the number of companies
+    written.
+    """
+    backend = get_fundamentals_cache_backend()
+    max_age = get_cache_max_age(CacheDataType.fundamentals)
+    cached_count = 0
+    offset = 0
+    while True:
+        url = (
+            f"{get_eodhd_base_url()}/bulk-fundamentals/{exchange_code}?api_token={api_token}&fmt=json"
+            f"&offset={offset}&limit={page_size}"
+        )
+        page = request_json(url)
+        if not page:
+            break
+
+        companies = list(page.values()) if isinstance(page, dict) else page
+        for company_json in companies:
+            try:
+                ticker_code = company_json["General"]["Code"]
+            except (KeyError, TypeError):
+                continue
+
+            file_path = get_fundamentals_file_path(
+                exchange_code, ticker_code, sections_only=True
+            )
+            fetched_at = get_cached_json_fetched_at(file_path, backend)
+            if fetched_at is not None:
+                cached_json = read_cached_json(file_path, backend, decode_fundamentals)
+                # A single ticker document has every year, the bulk one would only thin it out
+                if cached_json is not None and not is_bulk_fundamentals(cached_json):
+                    continue
+
+                updated = is_updated_since(company_json, fetched_at)
+                if not override and (
+                    updated is False
+                    or (updated is None and time.time() - fetched_at < max_age.total_seconds())
+                ):
+                    continue
+
+            converted_json = convert_bulk_fundamentals(company_json)
+            write_cached_json(converted_json, file_path, backend)
+            index_company_sector(exchange_code, ticker_code, converted_json)
+            cached_count += 1
+
+        if len(companies) < page_size:
+            break
+        offset += page_size
+
+    print(f"Cached bulk fundamentals for {cached_count} companies on {exchange_code}")
+    return cached_count
+
+
+def convert_bulk_fundamentals(company_json: dict) -> dict:
+    """
+    Bulk fundamentals label statements by recency (yearly_last_0, yearly_last_1, ...) rather than
+    by date and leave out SharesStats, outstandingShares and the earnings trend. Reshape a company
+    into the single ticker layout, filling the missing sections with empty defaults.
+    """
+    financials = {}
+    for statement, periods in company_json.get("Financials", {}).items():
+        if not isinstance(periods, dict):
+            continue
+
+        yearly = {
+            details["date"]: details
+            for period, details in periods.items()
+            if period.startswith("yearly_last_")
+            and isinstance(details, dict)
+            and details.get("date")
+        }
+        financials[statement] = {
+            "currency_symbol": periods.get("currency_symbol"),
+            # Most recent year first, as in the single ticker documents
+            "yearly": dict(sorted(yearly.items(), reverse=True)),
+        }
+
+    try:
+        latest_balance_sheet = next(iter(financials["Balance_Sheet"]["yearly"].values()))
+        shares_outstanding = float(latest_balance_sheet["commonStockSharesOutstanding"])
+    except (KeyError, StopIteration, ValueError, TypeError):
+        shares_outstanding = None
+
+    earnings = company_json.get("Earnings") or {}
+    return {
+        "Source": BULK_FUNDAMENTALS_SOURCE,
+        "General": company_json.get("General", {}),
+        "Highlights": company_json.get("Highlights", {}),
+        "Valuation": company_json.get("Valuation", {}),
+        "SharesStats": {"SharesOutstanding": shares_outstanding},
+        "outstandingShares": {"annual": {}},
+        "Earnings": {"Trend": earnings.get("Trend", {})},
+        "Financials": financials,
+    }
+
+
+def nest_filtered_fundamentals(json_data: dict) -> dict:
+    """
+    A filtered response is keyed by the filter paths ("Financials::Balance_Sheet::yearly"),
+    rebuild the nesting of the full document so it can be read the same way.
+    """
+    if not isinstance(json_data, dict):
+        return json_data
+
+    nested_data = {}
+    for path, value in json_data.items():
+        *parents, key = path.split("::")
+        section = nested_data
+        for parent in parents:
+            section = section.setdefault(parent, {})
+        section[key] = value
+
+    return nested_data
+
+
+def get_fundamental_data_concurrently(
+    api_token: str,
+    exchange_code: str,
+    ticker_codes: Iterable[str],
+    jobs: int = 8,
+    max_requests_per_second: float | None = None,
+    override: bool = False,
+    sections_only: bool = False,
+) -> Iterator[tuple[str, dict]]:
+    """
+    Fetches fundamentals for many tickers with up to `jobs` requests in flight, yielding
+    (ticker_code, json) pairs in completion order. Only a small window of tickers is
+    submitted ahead of the consumer so completed documents don't pile up in memory.
+    """
+    rate_limiter = RateLimiter(max_requests_per_second)
+    configure_http_session(jobs)
+    remaining_tickers = iter(ticker_codes)
+
+    def fetch(ticker_code: str) -> tuple[str, dict]:
+        return ticker_code, get_fundamental_data(
+            api_token, exchange_code, ticker_code, override, rate_limiter, sections_only
+        )
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = set()
+        for _ in range(jobs * 2):
+            ticker_code = next(remaining_tickers, None)
+            if ticker_code is None:
+                break
+            pending.add(executor.submit(fetch, ticker_code))
+
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    ticker_code = next(remaining_tickers, None)
+                    if ticker_code is not None:
+                        pending.add(executor.submit(fetch, ticker_code))
+                    yield future.result()
+        finally:
+            # The consumer stopped early (e.g. max_tickers reached), drop queued fetches
+            for future in pending:
+                future.cancel()
+
+
+def index_missing_sectors(
+    api_token: str, exchange_code: str, ticker_codes: list[str], jobs: int = 8
+) -> None:
+    """
+    Adds companies cached before the sector index existed to it, reading (or fetching) each
+    missing company's fundamentals once.
+    """
+    indexed_codes = return_indexed_codes(exchange_code)
+    missing_codes = [code for code in ticker_codes if code not in indexed_codes]
+    if not missing_codes:
+        return
+
+    for ticker_code, json_data in get_fundamental_data_concurrently(
+        api_token, exchange_code, missing_codes, jobs=jobs
+    ):
+        if is_classifiable(json_data):
+            index_company_sector(exchange_code, ticker_code, json_data)
+        else:
+            index_unclassified_company(exchange_code, ticker_code)
+
+    print(f"Indexed the sectors of {len(missing_codes)} companies on {exchange_code}")
 
 
 def get_stock_close_price(
     api_token: str, exchange_code: str, ticker_code: str
 ) -> float:
-    json = get_real_time_data(api_token, exchange_code, ticker_code)
-    try:
-        close_price = float(json["close"])
-    except (ValueError, TypeError):
-        close_price = None
-
-    return close_price
+    # Real time data isn't available under the Fundamentals plan, use the bulk end of day prices
+    return get_bulk_close_prices(api_token, exchange_code).get(ticker_code)
 
 
 def get_exchange_common_stock_count(api_token: str, exchange_code: str) -> int:
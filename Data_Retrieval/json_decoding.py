@@ -0,0 +1,172 @@
+import json
+import os
+from typing import Any, BinaryIO, TypedDict
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+# Typed view of the fundamentals document, limited to the fields the reports read.
+# Decoding against it skips everything else (quarterly statements, holders, earnings history, ...).
+class GeneralSection(TypedDict, total=False):
+    Code: Any
+    Type: Any
+    Name: Any
+    Exchange: Any
+    PrimaryTicker: Any
+    FiscalYearEnd: Any
+    IPODate: Any
+    InternationalDomestic: Any
+    Sector: Any
+    GicSector: Any
+    GicGroup: Any
+    GicIndustry: Any
+    Description: Any
+    FullTimeEmployees: Any
+    UpdatedAt: Any
+
+
+class FinancialStatementSection(TypedDict, total=False):
+    currency_symbol: str | None
+    yearly: dict[str, dict[str, Any]]
+
+
+class FinancialsSection(TypedDict, total=False):
+    Income_Statement: FinancialStatementSection | None
+    Cash_Flow: FinancialStatementSection | None
+    Balance_Sheet: FinancialStatementSection | None
+
+
+class EarningsSection(TypedDict, total=False):
+    Trend: dict[str, dict[str, Any]] | None
+
+
+class FundamentalsDocument(TypedDict, total=False):
+    # Set to "bulk" on documents converted from the bulk fundamentals endpoint
+    Source: str | None
+    General: GeneralSection | None
+    Highlights: dict[str, Any] | None
+    SharesStats: dict[str, Any] | None
+    Valuation: dict[str, Any] | None
+    Earnings: EarningsSection | None
+    outstandingShares: dict[str, Any] | None
+    Financials: FinancialsSection | None
+
+
+fundamentals_decoder = (
+    msgspec.json.Decoder(FundamentalsDocument) if msgspec is not None else None
+)
+
+# The same sections in ijson's dotted prefix notation, for streaming them out of a document
+fundamentals_stream_paths = (
+    "Source",
+    "General",
+    "Highlights",
+    "SharesStats",
+    "Valuation",
+    "Earnings.Trend",
+    "outstandingShares",
+    "Financials.Income_Statement.yearly",
+    "Financials.Cash_Flow.yearly",
+    "Financials.Balance_Sheet.yearly",
+)
+
+
+def is_fundamentals_streaming_enabled() -> bool:
+    # Streaming is only worth it with ijson's C parser, the pure python backends are much slower
+    # than a full decode. Can be forced on or off with stream_fundamentals=1/0.
+    stream_fundamentals = os.getenv("stream_fundamentals")
+    if stream_fundamentals is not None:
+        return ijson is not None and bool(int(stream_fundamentals))
+
+    return ijson is not None and ijson.backend in ("yajl2_c", "yajl2_cffi")
+
+
+def decode_json(json_file: BinaryIO):
+    raw = json_file.read()
+    if orjson is not None:
+        return orjson.loads(raw)
+
+    return json.loads(raw)
+
+
+def decode_fundamentals(json_file: BinaryIO):
+    """
+    Decodes a fundamentals document into plain dicts holding only the sections the reports use.
+    The sections are streamed out of the file when possible, otherwise the file is decoded against
+    the typed schema, falling back to a full decode if msgspec isn't installed or it doesn't match.
+    """
+    if is_fundamentals_streaming_enabled():
+        return stream_fundamentals(json_file)
+
+    raw = json_file.read()
+    if fundamentals_decoder is not None:
+        try:
+            return fundamentals_decoder.decode(raw)
+        except msgspec.DecodeError:
+            # Let the untyped decoder report malformed JSON the usual way
+            pass
+
+    if orjson is not None:
+        return orjson.loads(raw)
+
+    return json.loads(raw)
+
+
+def stream_fundamentals(
+    json_file: BinaryIO, paths: tuple = fundamentals_stream_paths
+) -> dict:
+    """
+    Incrementally parses the file and builds only the values at the given paths, so the rest of
+    the document (quarterly statements, holders, ...) is never held in memory.
+    """
+    wanted_paths = set(paths)
+    json_data = {}
+    builder = None
+    builder_path = None
+    depth = 0
+    try:
+        for prefix, event, value in ijson.parse(json_file, use_float=True):
+            if builder is None:
+                if prefix not in wanted_paths or event in ("map_key", "end_map", "end_array"):
+                    continue
+
+                if event not in ("start_map", "start_array"):
+                    # A wanted path holding a scalar (usually null)
+                    set_nested_value(json_data, prefix, value)
+                    continue
+
+                builder = ijson.ObjectBuilder()
+                builder_path = prefix
+
+            builder.event(event, value)
+            if event in ("start_map", "start_array"):
+                depth += 1
+            elif event in ("end_map", "end_array"):
+                depth -= 1
+                if depth == 0:
+                    set_nested_value(json_data, builder_path, builder.value)
+                    builder = None
+    except ijson.JSONError as e:
+        raise json.JSONDecodeError(str(e), "", 0)
+
+    return json_data
+
+
+def set_nested_value(json_data: dict, path: str, value) -> None:
+    *parents, key = path.split(".")
+    for parent in parents:
+        json_data = json_data.setdefault(parent, {})
+    json_data[key] = value
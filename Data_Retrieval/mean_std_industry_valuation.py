@@ -1,17 +1,199 @@
+import atexit
+import glob
 import json
 import os
+import sqlite3
+import threading
+import time
+from enum import Enum
 
 import numpy as np
+import pandas as pd
 
-from Data_Retrieval.shared_functions import calculate_median_absolute_deviation
+from Data_Retrieval.quantile_sketch import KllSketch
+
+
+class IndustryStatisticsBackend(Enum):
+    # Median and MAD over every recorded value
+    exact = "exact"
+    # Median and MAD approximated from a persisted KLL sketch per industry and metric
+    sketch = "sketch"
+
+
+# Companies upserted before the pending valuation rows are committed
+VALUATION_COMMIT_BATCH_SIZE = 200
+
+KEYS_CANT_BE_NEGATIVE = [
+    "P/S",
+    "EV/EBITDA",
+    "EV/EBIT",
+    "P/TB",
+    "P/B",
+    "Debt/Equity",
+    "Trailing P/E",
+    "Forward P/E",
+    "P/CFO",
+    "P/FCF",
+    "P/NCF",
+    "P/Div",
+    "P/Cash",
+    "P/NCash",
+]
+# Metrics industry medians and MADs are computed for, in report order
+INDUSTRY_STATISTICS_KEYS = [
+    "Price",
+    "MktCap",
+    "EV",
+    "Revenue",
+    "Div Yield",
+    "P/S",
+    "EV/EBITDA",
+    "EV/EBIT",
+    "P/B",
+    "P/TB",
+    "Debt/Equity",
+    "Trailing P/E",
+    "Forward P/E",
+    "PEG 3yr",
+    "P/CFO",
+    "P/FCF",
+    "P/Div",
+    "P/Cash",
+    "P/NCash",
+    "P/NN",
+    "Interest Cov",
+    "Service Cov",
+    "Asset Cov",
+]
+
+valuation_connection = None
+valuation_lock = threading.Lock()
+pending_valuation_count = 0
+migrated_exchanges = set()
+# (exchange, industry) -> {"Median": ..., "MAD": ...} computed since a company was last added
+industry_statistics = {}
+# (exchange, industry) -> {metric: (sorted values, fraction of the industry at or below each value)}
+industry_percentile_tables = {}
+# (exchange, industry) -> {"Codes": set of companies inserted, "Metrics": {metric: KllSketch}}
+industry_sketches = {}
+dirty_industry_sketches = set()
+
+
+def get_industry_statistics_backend() -> IndustryStatisticsBackend:
+    return IndustryStatisticsBackend(
+        os.getenv("industry_statistics_backend", IndustryStatisticsBackend.exact.value)
+    )
+
+
+def get_valuation_directory() -> str:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(script_dir), "Data/Fundamentals/Valuation")
+
+
+def get_valuation_connection() -> sqlite3.Connection:
+    """
+    Opens the valuation store, one row per exchange, industry, company and metric, so a company
+    is upserted without reading or rewriting the rest of its industry.
+    """
+    global valuation_connection
+    if valuation_connection is None:
+        directory = get_valuation_directory()
+        os.makedirs(directory, exist_ok=True)
+        valuation_connection = sqlite3.connect(
+            os.path.join(directory, "valuations.sqlite"), check_same_thread=False
+        )
+        valuation_connection.execute("PRAGMA journal_mode=WAL")
+        valuation_connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS valuations (
+                exchange TEXT NOT NULL,
+                industry TEXT NOT NULL,
+                code TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                value REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (exchange, industry, code, metric)
+            )
+            """
+        )
+        valuation_connection.execute(
+            "CREATE TABLE IF NOT EXISTS migrated_exchanges (exchange TEXT PRIMARY KEY)"
+        )
+        valuation_connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS industry_sketches (
+                exchange TEXT NOT NULL,
+                industry TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (exchange, industry)
+            )
+            """
+        )
+        valuation_connection.commit()
+        atexit.register(commit_valuations)
+
+    return valuation_connection
+
+
+def migrate_industry_json_files(connection: sqlite3.Connection, exchange: str) -> None:
+    """Imports the per industry JSON files an exchange was tracked in before the store, once."""
+    if exchange in migrated_exchanges:
+        return
+    migrated_exchanges.add(exchange)
+
+    if connection.execute(
+        "SELECT 1 FROM migrated_exchanges WHERE exchange = ?", (exchange,)
+    ).fetchone():
+        return
+
+    for file_path in glob.glob(os.path.join(get_valuation_directory(), exchange, "*.json")):
+        industry = os.path.splitext(os.path.basename(file_path))[0]
+        if industry.endswith("_Average"):
+            continue
+
+        try:
+            with open(file_path, "r") as json_file:
+                companies = json.load(json_file)["Companies"]
+        except (json.JSONDecodeError, KeyError) as e:
+            print(f"Error migrating valuations in {file_path}: {e}")
+            continue
+
+        # Files are only migrated once, so keep their rows in place if a company is already in the store
+        connection.executemany(
+            "INSERT OR IGNORE INTO valuations (exchange, industry, code, metric, value, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (exchange, industry, company["Code"], metric, value, os.path.getmtime(file_path))
+                for company in companies
+                for metric, value in filter_valuation_values(company).items()
+            ],
+        )
+        print(f'Migrated {len(companies)} valuations from "{file_path}"')
+
+    connection.execute("INSERT INTO migrated_exchanges (exchange) VALUES (?)", (exchange,))
+    connection.commit()
+
+
+def filter_valuation_values(ordered_dict: dict) -> dict:
+    values = {}
+    for key, value in ordered_dict.items():
+        if (
+            value is not None
+            and isinstance(value, (int, float))
+            and not isinstance(value, bool)
+            and not np.isnan(value)
+            and not (key in KEYS_CANT_BE_NEGATIVE and value < 0)
+        ):
+            values[key] = value
+
+    return values
 
 
 def add_company_to_valuation_list(
     ordered_dict: dict, exchange: str, company_code: str, industry: str
 ) -> None:
-    file_path = (
-        f"F:/Stock Analysis/Data/Fundamentals/Valuation/{exchange}/{industry}.json"
-    )
+    global pending_valuation_count
 
     try:
         market_cap = round(float(ordered_dict["MktCap"]), 2)
@@ -22,172 +204,340 @@ def add_company_to_valuation_list(
     except ValueError:
         return
 
-    keys_cant_be_negative = [
-        "P/S",
-        "EV/EBITDA",
-        "EV/EBIT",
-        "P/TB",
-        "P/B",
-        "Debt/Equity",
-        "Trailing P/E",
-        "Forward P/E",
-        "P/CFO",
-        "P/FCF",
-        "P/NCF",
-        "P/Div",
-        "P/Cash",
-        "P/NCash",
-    ]
-    try:
-        with open(file_path, "r") as json_file:
-            json_data = json.load(json_file)
-            existing_entry = next(
-                (
-                    entry
-                    for entry in json_data["Companies"]
-                    if entry["Code"] == company_code
-                ),
-                None,
-            )
+    values_to_update = filter_valuation_values(ordered_dict)
+    updated_at = time.time()
+    with valuation_lock:
+        connection = get_valuation_connection()
+        migrate_industry_json_files(connection, exchange)
+        # Metrics missing from this run keep their previous value, like the old in place update
+        connection.executemany(
+            "INSERT INTO valuations (exchange, industry, code, metric, value, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (exchange, industry, code, metric) "
+            "DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+            [
+                (exchange, industry, company_code, metric, value, updated_at)
+                for metric, value in values_to_update.items()
+            ],
+        )
 
-            if existing_entry:
-                values_to_update = {}
-                for key, value in ordered_dict.items():
-                    if (
-                        value is not None
-                        and isinstance(value, (int, float))
-                        and not np.isnan(value)
-                        and not (key in keys_cant_be_negative and value < 0)
-                    ):
-                        values_to_update[key] = value
-            else:
-                values_to_update = update_existing_df(
-                    keys_cant_be_negative, ordered_dict
-                )
-
-            if values_to_update:
-                if existing_entry:
-                    existing_entry.update(values_to_update)
-                else:
-                    json_data["Companies"].append(values_to_update)
-
-        with open(file_path, "w") as json_file:
-            json.dump(json_data, json_file, indent=2)
+        if get_industry_statistics_backend() == IndustryStatisticsBackend.sketch:
+            update_industry_sketches(connection, exchange, industry, company_code, values_to_update)
 
-    except FileNotFoundError:
-        print(f"File not found: {file_path}, creating a new file.")
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        directory = os.path.join(
-            os.path.dirname(script_dir), f"Data/Fundamentals/Valuation/{exchange}"
-        )
-        if not os.path.exists(directory):
-            os.makedirs(directory)
+        # The industry's cached statistics and percentile tables leave this company's new values
+        # out, recompute them on next use
+        industry_statistics.pop((exchange, industry), None)
+        industry_percentile_tables.pop((exchange, industry), None)
 
-        with open(file_path, "w") as json_file:
-            values_to_update = update_existing_df(keys_cant_be_negative, ordered_dict)
+        pending_valuation_count += 1
+        if pending_valuation_count >= VALUATION_COMMIT_BATCH_SIZE:
+            connection.commit()
+            pending_valuation_count = 0
 
-            if values_to_update:
-                json.dump({"Companies": [values_to_update]}, json_file, indent=2)
 
+def commit_valuations() -> None:
+    global pending_valuation_count
+    with valuation_lock:
+        if valuation_connection is not None:
+            persist_industry_sketches(valuation_connection)
+            valuation_connection.commit()
+            pending_valuation_count = 0
 
-def update_existing_df(keys_cant_be_negative: list, ordered_dict: dict):
-    values_to_update = {"Code": ordered_dict["Code"]}
-    for key, value in ordered_dict.items():
-        if (
-            value is not None
-            and isinstance(value, (int, float))
-            and not np.isnan(value)
-            and not (key in keys_cant_be_negative and value < 0)
-        ):
-            values_to_update[key] = value
 
-    return values_to_update
+def return_industry_valuations(exchange: str, industry: str | None = None) -> pd.DataFrame:
+    """Returns the recorded (industry, metric, value) rows for an exchange, or one of its industries."""
+    query = "SELECT industry, metric, value FROM valuations WHERE exchange = ?"
+    parameters = (exchange,)
+    if industry is not None:
+        query += " AND industry = ?"
+        parameters += (industry,)
 
+    with valuation_lock:
+        connection = get_valuation_connection()
+        migrate_industry_json_files(connection, exchange)
+        rows = connection.execute(query, parameters).fetchall()
 
-def return_mean_std_industry_valuations(exchange: str, industry: str) -> dict:
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(
-        os.path.dirname(script_dir),
-        f"Data/Fundamentals/Valuation/{exchange}/{industry}.json",
+    return pd.DataFrame.from_records(rows, columns=["industry", "metric", "value"])
+
+
+def calculate_industry_statistics(valuations_df: pd.DataFrame) -> dict:
+    """Median and Median Absolute Deviation (MAD) of every industry and metric, in one grouped pass."""
+    valuations_df = valuations_df[valuations_df["metric"].isin(INDUSTRY_STATISTICS_KEYS)]
+    grouped_values = valuations_df.groupby(["industry", "metric"])["value"]
+    deviations = (valuations_df["value"] - grouped_values.transform("median")).abs()
+    statistics_df = pd.DataFrame(
+        {
+            "Median": grouped_values.median(),
+            "MAD": deviations.groupby([valuations_df["industry"], valuations_df["metric"]]).median(),
+        }
+    ).round(2)
+
+    statistics_by_industry = {}
+    for industry, industry_df in statistics_df.groupby(level="industry"):
+        industry_df = industry_df.droplevel("industry")
+        metrics = [key for key in INDUSTRY_STATISTICS_KEYS if key in industry_df.index]
+        statistics_by_industry[industry] = {
+            "Median": {key: industry_df.at[key, "Median"] for key in metrics},
+            "MAD": {key: industry_df.at[key, "MAD"] for key in metrics},
+        }
+
+    return statistics_by_industry
+
+
+def load_industry_sketches(
+    connection: sqlite3.Connection, exchange: str, industry: str
+) -> dict | None:
+    """Returns the industry's sketches, reading them from the store the first time, or None if never built."""
+    if (exchange, industry) not in industry_sketches:
+        row = connection.execute(
+            "SELECT payload FROM industry_sketches WHERE exchange = ? AND industry = ?",
+            (exchange, industry),
+        ).fetchone()
+        if row is None:
+            return None
+
+        payload = json.loads(row[0])
+        industry_sketches[(exchange, industry)] = {
+            "Codes": set(payload["Codes"]),
+            "Metrics": {
+                metric: KllSketch.from_dict(sketch_dict)
+                for metric, sketch_dict in payload["Metrics"].items()
+            },
+        }
+
+    return industry_sketches[(exchange, industry)]
+
+
+def update_industry_sketches(
+    connection: sqlite3.Connection, exchange: str, industry: str, company_code: str, values: dict
+) -> None:
+    """
+    Inserts a company into its industry's sketches. Sketches can't remove values, so a company
+    already in them keeps its old values until the next aggregate_industry_valuations rebuild.
+    Industries without sketches yet are built from the stored rows when first needed.
+    """
+    sketches = load_industry_sketches(connection, exchange, industry)
+    if sketches is None or company_code in sketches["Codes"]:
+        return
+
+    for metric, value in values.items():
+        if metric in INDUSTRY_STATISTICS_KEYS:
+            sketches["Metrics"].setdefault(metric, KllSketch()).update(value)
+    sketches["Codes"].add(company_code)
+    dirty_industry_sketches.add((exchange, industry))
+
+
+def build_industry_sketches(exchange: str, industry: str | None = None) -> dict:
+    """Rebuilds the sketches of an exchange, or one of its industries, from the stored rows."""
+    query = "SELECT industry, code, metric, value FROM valuations WHERE exchange = ?"
+    parameters = (exchange,)
+    if industry is not None:
+        query += " AND industry = ?"
+        parameters += (industry,)
+
+    with valuation_lock:
+        connection = get_valuation_connection()
+        migrate_industry_json_files(connection, exchange)
+        rows = connection.execute(query, parameters).fetchall()
+
+        rebuilt_sketches = {}
+        for row_industry, code, metric, value in rows:
+            sketches = rebuilt_sketches.setdefault(row_industry, {"Codes": set(), "Metrics": {}})
+            sketches["Codes"].add(code)
+            if metric in INDUSTRY_STATISTICS_KEYS:
+                sketches["Metrics"].setdefault(metric, KllSketch()).update(value)
+
+        for row_industry, sketches in rebuilt_sketches.items():
+            industry_sketches[(exchange, row_industry)] = sketches
+            dirty_industry_sketches.add((exchange, row_industry))
+
+    return rebuilt_sketches
+
+
+def persist_industry_sketches(connection: sqlite3.Connection) -> None:
+    rows = []
+    for exchange, industry in dirty_industry_sketches:
+        sketches = industry_sketches[(exchange, industry)]
+        payload = {
+            "Codes": sorted(sketches["Codes"]),
+            "Metrics": {metric: sketch.to_dict() for metric, sketch in sketches["Metrics"].items()},
+        }
+        rows.append((exchange, industry, json.dumps(payload), time.time()))
+
+    connection.executemany(
+        "INSERT OR REPLACE INTO industry_sketches (exchange, industry, payload, updated_at) "
+        "VALUES (?, ?, ?, ?)",
+        rows,
     )
+    dirty_industry_sketches.clear()
+
+
+def return_industry_sketches(exchange: str, industry: str) -> dict:
+    with valuation_lock:
+        sketches = load_industry_sketches(get_valuation_connection(), exchange, industry)
+    if sketches is None:
+        sketches = build_industry_sketches(exchange, industry).get(industry, {"Codes": set(), "Metrics": {}})
+
+    return sketches["Metrics"]
+
+
+def merge_industry_sketches(exchanges: list[str], industry: str) -> dict:
+    """Merges an industry's sketches across exchanges, e.g. to compare a company against a region."""
+    merged_sketches = {}
+    for exchange in exchanges:
+        for metric, sketch in return_industry_sketches(exchange, industry).items():
+            merged_sketches.setdefault(metric, KllSketch()).merge(sketch)
+
+    return merged_sketches
+
+
+def calculate_sketch_statistics(sketches: dict) -> dict:
+    """Approximate Median and MAD of every metric, exact while a sketch still holds all its values."""
+    result_dict = {"Median": {}, "MAD": {}}
+    for key in INDUSTRY_STATISTICS_KEYS:
+        if key in sketches and sketches[key].count:
+            median, mad = sketches[key].median_absolute_deviation()
+            # numpy floats, so a zero MAD divides to inf like the exact statistics
+            result_dict["Median"][key] = np.round(np.float64(median), 2)
+            result_dict["MAD"][key] = np.round(np.float64(mad), 2)
+
+    return result_dict
+
+
+def return_industry_quantiles(
+    exchanges: list[str], industry: str, metric: str, fractions: list[float]
+) -> list[float]:
+    sketch = merge_industry_sketches(exchanges, industry).get(metric)
+    if sketch is None:
+        return [np.nan for _ in fractions]
+
+    return [sketch.quantile(fraction) for fraction in fractions]
+
+
+def calculate_percentile_tables(valuations_df: pd.DataFrame) -> dict:
+    """Sorted values of every industry and metric, so companies are ranked against them by binary search."""
+    valuations_df = valuations_df[valuations_df["metric"].isin(INDUSTRY_STATISTICS_KEYS)]
+    percentile_tables = {}
+    for (industry, metric), values in valuations_df.groupby(["industry", "metric"])["value"]:
+        sorted_values = np.sort(values.to_numpy())
+        fractions = np.arange(1, len(sorted_values) + 1) / len(sorted_values)
+        percentile_tables.setdefault(industry, {})[metric] = (sorted_values, fractions)
+
+    return percentile_tables
+
+
+def calculate_sketch_percentile_tables(sketches: dict) -> dict:
+    percentile_tables = {}
+    for metric, sketch in sketches.items():
+        if sketch.count:
+            values, weights = sketch.weighted_items()
+            cumulative_weights = np.cumsum(weights)
+            percentile_tables[metric] = (values, cumulative_weights / cumulative_weights[-1])
+
+    return percentile_tables
+
+
+def return_percentile_rank(percentile_table: tuple | None, value) -> float | None:
+    """Fraction of the industry below value, counting companies tied with it as half, or None if unranked."""
     try:
-        with open(file_path, "r") as json_file:
-            # Parse the JSON data
-            json_data = json.load(json_file)
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if percentile_table is None or np.isnan(value):
+        return None
 
-            # Initialize dictionaries to accumulate values
-            keys = [
-                "Price",
-                "MktCap",
-                "EV",
-                "Revenue",
-                "Div Yield",
-                "P/S",
-                "EV/EBITDA",
-                "EV/EBIT",
-                "P/B",
-                "P/TB",
-                "Debt/Equity",
-                "Trailing P/E",
-                "Forward P/E",
-                "PEG 3yr",
-                "P/CFO",
-                "P/FCF",
-                "P/Div",
-                "P/Cash",
-                "P/NCash",
-                "P/NN",
-                "Interest Cov",
-                "Service Cov",
-                "Asset Cov",
-            ]
-            numeric_data = {key: [] for key in keys}
-
-            for company in json_data["Companies"]:
-                for key, value in company.items():
-                    if (
-                        isinstance(value, float)
-                        and not np.isnan(value)
-                        and key in numeric_data
-                    ):
-                        # Update numeric data for each key
-                        numeric_data[key].append(value)
-
-            # Calculate median and Median Absolute Deviation (MAD) based on accumulated values
-            filtered_data = {
-                key: [
-                    item
-                    for item in numeric_data[key]
-                    if isinstance(item, (int, float)) and not np.isnan(item)
-                ]
-                for key in numeric_data
-                if numeric_data[key]
-            }
-
-            median_values = {
-                key: round(np.median(filtered_data[key]), 2) for key in filtered_data
-            }
-            mad_values = {
-                key: round(
-                    calculate_median_absolute_deviation(np.array(filtered_data[key])), 2
-                )
-                for key in filtered_data
-            }
-
-            # Save median and MAD into another dictionary
-            result_dict = {"Median": median_values, "MAD": mad_values}
+    values, fractions = percentile_table
+    below = np.searchsorted(values, value, side="left")
+    at_or_below = np.searchsorted(values, value, side="right")
+    fraction_below = fractions[below - 1] if below else 0.0
+    fraction_at_or_below = fractions[at_or_below - 1] if at_or_below else 0.0
+    return float(fraction_below + fraction_at_or_below) / 2
 
-    except FileNotFoundError:
-        return {}
 
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    result_file_path = os.path.join(
-        os.path.dirname(script_dir),
-        f"Data/Fundamentals/Valuation/{exchange}/{industry}_Average.json",
-    )
+def return_industry_percentile_tables(exchange: str, industry: str) -> dict:
+    if (exchange, industry) not in industry_percentile_tables:
+        if get_industry_statistics_backend() == IndustryStatisticsBackend.sketch:
+            percentile_tables = calculate_sketch_percentile_tables(
+                return_industry_sketches(exchange, industry)
+            )
+        else:
+            percentile_tables = calculate_percentile_tables(
+                return_industry_valuations(exchange, industry)
+            ).get(industry, {})
+        industry_percentile_tables[(exchange, industry)] = percentile_tables
+
+    return industry_percentile_tables[(exchange, industry)]
+
+
+def save_industry_statistics(exchange: str, industry: str, result_dict: dict) -> None:
+    industry_statistics[(exchange, industry)] = result_dict
+
+    result_directory = os.path.join(get_valuation_directory(), exchange)
+    os.makedirs(result_directory, exist_ok=True)
+    result_file_path = os.path.join(result_directory, f"{industry}_Average.json")
     with open(result_file_path, "w") as result_file:
         json.dump(result_dict, result_file)
 
+
+def aggregate_industry_valuations(exchange: str, industry: str | None = None) -> dict:
+    """
+    Recomputes the statistics of every industry on the exchange, or just the one given, from the
+    rows collected so far, refreshing the in memory cache and each industry's _Average.json. Run
+    once an exchange run has added all of its companies. With the sketch backend the sketches are
+    rebuilt too, dropping values single-ticker runs have since replaced.
+    """
+    commit_valuations()
+    if get_industry_statistics_backend() == IndustryStatisticsBackend.sketch:
+        exchange_sketches = {
+            sketch_industry: sketches["Metrics"]
+            for sketch_industry, sketches in build_industry_sketches(exchange, industry).items()
+            if sketches["Metrics"]
+        }
+        commit_valuations()
+        exchange_statistics = {
+            sketch_industry: calculate_sketch_statistics(sketches)
+            for sketch_industry, sketches in exchange_sketches.items()
+        }
+        exchange_percentile_tables = {
+            sketch_industry: calculate_sketch_percentile_tables(sketches)
+            for sketch_industry, sketches in exchange_sketches.items()
+        }
+    else:
+        valuations_df = return_industry_valuations(exchange, industry)
+        exchange_statistics = calculate_industry_statistics(valuations_df)
+        exchange_percentile_tables = calculate_percentile_tables(valuations_df)
+
+    for industry, result_dict in exchange_statistics.items():
+        save_industry_statistics(exchange, industry, result_dict)
+        industry_percentile_tables[(exchange, industry)] = exchange_percentile_tables[industry]
+
+    print(f"Aggregated valuations of {len(exchange_statistics)} industries on exchange {exchange}")
+    return exchange_statistics
+
+
+def return_mean_std_industry_valuations(exchange: str, industry: str) -> dict:
+    # Statistics are computed once per industry until a company is added to it, an exchange run
+    # adds every company before formatting them so they all share one computation
+    if (exchange, industry) in industry_statistics:
+        return industry_statistics[(exchange, industry)]
+
+    if get_industry_statistics_backend() == IndustryStatisticsBackend.sketch:
+        sketches = return_industry_sketches(exchange, industry)
+        if not sketches:
+            return {}
+
+        result_dict = calculate_sketch_statistics(sketches)
+        save_industry_statistics(exchange, industry, result_dict)
+        return result_dict
+
+    valuations_df = return_industry_valuations(exchange, industry)
+    if valuations_df.empty:
+        return {}
+
+    result_dict = calculate_industry_statistics(valuations_df).get(
+        industry, {"Median": {}, "MAD": {}}
+    )
+    save_industry_statistics(exchange, industry, result_dict)
     return result_dict
 
 
@@ -0,0 +1,123 @@
+import math
+
+import numpy as np
+
+# Items kept on the top level, higher is more accurate (rank error roughly 1.7 / k) but larger
+DEFAULT_SKETCH_K = 200
+# Lower levels shrink by this factor, so memory stays O(k) however many values are inserted
+LEVEL_CAPACITY_FACTOR = 2 / 3
+MIN_LEVEL_CAPACITY = 8
+
+
+class KllSketch:
+    """
+    KLL quantile sketch: mergeable, bounded memory approximate quantiles over a stream of values.
+
+    Values are kept in levels, an item on level h standing for 2**h inserted values. When the sketch
+    is over capacity the lowest full level is sorted and every other item promoted to the level
+    above, alternating which half survives so merged and repeated runs stay deterministic. Until the
+    first compaction every value is kept, so small populations give exact statistics.
+    """
+
+    def __init__(self, k: int = DEFAULT_SKETCH_K):
+        self.k = k
+        self.levels = [[]]
+        self.offsets = [0]
+        self.count = 0
+
+    def level_capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(MIN_LEVEL_CAPACITY, math.ceil(self.k * LEVEL_CAPACITY_FACTOR**depth))
+
+    def is_exact(self) -> bool:
+        return len(self.levels) == 1
+
+    def update(self, value: float) -> None:
+        self.levels[0].append(float(value))
+        self.count += 1
+        if len(self.levels[0]) >= self.level_capacity(0):
+            self.compress()
+
+    def merge(self, other: "KllSketch") -> None:
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+            self.offsets.append(0)
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.count += other.count
+        self.compress()
+
+    def compress(self) -> None:
+        while sum(map(len, self.levels)) >= sum(map(self.level_capacity, range(len(self.levels)))):
+            level = next(
+                h for h in range(len(self.levels)) if len(self.levels[h]) >= self.level_capacity(h)
+            )
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+                self.offsets.append(0)
+
+            items = sorted(self.levels[level])
+            # An odd item out stays behind so the weight of the sketch is preserved
+            kept = [items.pop()] if len(items) % 2 else []
+            self.levels[level + 1].extend(items[self.offsets[level] :: 2])
+            self.levels[level] = kept
+            self.offsets[level] ^= 1
+
+    def weighted_items(self) -> (np.ndarray, np.ndarray):
+        """Returns the retained values sorted, with the number of inserted values each stands for."""
+        values = np.array([value for items in self.levels for value in items], dtype=float)
+        weights = np.concatenate(
+            [np.full(len(items), 2**level, dtype=float) for level, items in enumerate(self.levels)]
+        )
+        order = np.argsort(values, kind="stable")
+        return values[order], weights[order]
+
+    def quantile(self, fraction: float) -> float:
+        values, weights = self.weighted_items()
+        if len(values) == 0:
+            return np.nan
+        if self.is_exact():
+            return np.quantile(values, fraction)
+
+        return weighted_quantile(values, weights, fraction)
+
+    def rank(self, value: float) -> float:
+        """Approximate fraction of inserted values at or below value."""
+        values, weights = self.weighted_items()
+        if len(values) == 0:
+            return np.nan
+
+        return weights[values <= value].sum() / weights.sum()
+
+    def median_absolute_deviation(self) -> (float, float):
+        """Returns the median and the median absolute deviation from it."""
+        values, weights = self.weighted_items()
+        if len(values) == 0:
+            return np.nan, np.nan
+
+        if self.is_exact():
+            median = np.median(values)
+            return median, np.median(np.abs(values - median))
+
+        median = weighted_quantile(values, weights, 0.5)
+        deviations = np.abs(values - median)
+        order = np.argsort(deviations, kind="stable")
+        return median, weighted_quantile(deviations[order], weights[order], 0.5)
+
+    def to_dict(self) -> dict:
+        return {"k": self.k, "count": self.count, "levels": self.levels, "offsets": self.offsets}
+
+    @classmethod
+    def from_dict(cls, sketch_dict: dict) -> "KllSketch":
+        sketch = cls(sketch_dict["k"])
+        sketch.count = sketch_dict["count"]
+        sketch.levels = sketch_dict["levels"]
+        sketch.offsets = sketch_dict["offsets"]
+        return sketch
+
+
+def weighted_quantile(values: np.ndarray, weights: np.ndarray, fraction: float) -> float:
+    """Smallest of the sorted values whose cumulative weight reaches fraction of the total."""
+    cumulative_weights = np.cumsum(weights)
+    index = np.searchsorted(cumulative_weights, fraction * cumulative_weights[-1], side="left")
+    return values[min(index, len(values) - 1)]
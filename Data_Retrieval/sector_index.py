@@ -0,0 +1,147 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Companies whose fundamentals couldn't be loaded are looked up again after this long
+UNCLASSIFIED_RETRY_SECONDS = 7 * 24 * 60 * 60
+
+sector_index_connection = None
+sector_index_lock = threading.Lock()
+
+
+def get_sector_index_file_path() -> str:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(script_dir), "Data/Fundamentals/sector_index.sqlite")
+
+
+def get_sector_index_connection() -> sqlite3.Connection:
+    """
+    Opens the ticker -> sector index, one row per exchange and company. industry is the name
+    companies are grouped by: GicSector, or Sector for companies without a GICS classification.
+    """
+    global sector_index_connection
+    if sector_index_connection is None:
+        file_path = get_sector_index_file_path()
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        sector_index_connection = sqlite3.connect(file_path, check_same_thread=False)
+        sector_index_connection.execute("PRAGMA journal_mode=WAL")
+        sector_index_connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sectors (
+                exchange TEXT NOT NULL,
+                code TEXT NOT NULL,
+                industry TEXT,
+                gic_sector TEXT,
+                gic_group TEXT,
+                gic_industry TEXT,
+                sector TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (exchange, code)
+            )
+            """
+        )
+        sector_index_connection.execute(
+            "CREATE INDEX IF NOT EXISTS sectors_by_industry ON sectors (exchange, industry)"
+        )
+        sector_index_connection.commit()
+
+    return sector_index_connection
+
+
+def clean_classification(value) -> str | None:
+    if not value or value == "null":
+        return None
+
+    return value
+
+
+def is_classifiable(json_data) -> bool:
+    return isinstance(json_data, dict) and isinstance(json_data.get("General"), dict)
+
+
+def index_company_sector(exchange_code: str, ticker_code: str, json_data: dict) -> None:
+    """Records the classification of a fundamentals document, called whenever one is cached."""
+    if not is_classifiable(json_data):
+        return
+
+    general = json_data["General"]
+    gic_sector = clean_classification(general.get("GicSector"))
+    sector = clean_classification(general.get("Sector"))
+    insert_company_sector(
+        exchange_code,
+        ticker_code,
+        (
+            gic_sector or sector,
+            gic_sector,
+            clean_classification(general.get("GicGroup")),
+            clean_classification(general.get("GicIndustry")),
+            sector,
+        ),
+    )
+
+
+def index_unclassified_company(exchange_code: str, ticker_code: str) -> None:
+    """
+    Records a company whose fundamentals couldn't be loaded without an industry, so it isn't
+    fetched again on every run until UNCLASSIFIED_RETRY_SECONDS have passed.
+    """
+    insert_company_sector(exchange_code, ticker_code, (None, None, None, None, None))
+
+
+def insert_company_sector(exchange_code: str, ticker_code: str, classification: tuple) -> None:
+    with sector_index_lock:
+        connection = get_sector_index_connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO sectors "
+            "(exchange, code, industry, gic_sector, gic_group, gic_industry, sector, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (exchange_code, ticker_code, *classification, time.time()),
+        )
+        connection.commit()
+
+
+def return_indexed_codes(exchange_code: str) -> set:
+    """The companies that don't need indexing, unclassified ones only until they are due a retry."""
+    with sector_index_lock:
+        rows = get_sector_index_connection().execute(
+            "SELECT code FROM sectors WHERE exchange = ? AND (industry IS NOT NULL OR updated_at > ?)",
+            (exchange_code, time.time() - UNCLASSIFIED_RETRY_SECONDS),
+        ).fetchall()
+
+    return {code for (code,) in rows}
+
+
+def return_industry_members(exchange_code: str, industry: str) -> set:
+    with sector_index_lock:
+        rows = get_sector_index_connection().execute(
+            "SELECT code FROM sectors WHERE exchange = ? AND industry = ?",
+            (exchange_code, industry),
+        ).fetchall()
+
+    return {code for (code,) in rows}
+
+
+def return_exchange_industries(exchange_code: str) -> list[str]:
+    with sector_index_lock:
+        rows = get_sector_index_connection().execute(
+            "SELECT DISTINCT industry FROM sectors WHERE exchange = ? AND industry IS NOT NULL "
+            "ORDER BY industry",
+            (exchange_code,),
+        ).fetchall()
+
+    return [industry for (industry,) in rows]
+
+
+def return_company_classification(exchange_code: str, ticker_code: str) -> dict | None:
+    with sector_index_lock:
+        row = get_sector_index_connection().execute(
+            "SELECT gic_sector, gic_group, gic_industry, sector FROM sectors "
+            "WHERE exchange = ? AND code = ?",
+            (exchange_code, ticker_code),
+        ).fetchone()
+
+    if row is None:
+        return None
+
+    return dict(zip(["GicSector", "GicGroup", "GicIndustry", "Sector"], row))
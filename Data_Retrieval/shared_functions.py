@@ -1,21 +1,59 @@
 import base64
+import html
 import json
+import math
 import os
+import threading
+import time
+from datetime import datetime, timedelta
 from enum import Enum
 from io import BytesIO
+from typing import Callable
 
-import matplotlib
 import numpy as np
 import pandas as pd
 import requests
 from bokeh.io import output_file, show
 from bokeh.models import TableColumn, ColumnDataSource, DataTable
-
-matplotlib.use("Agg")
-from matplotlib import pyplot as plt
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+
+from Data_Retrieval.cache_store import (
+    QUIET_COMPANY_MAX_AGE_FACTOR,
+    CacheBackend,
+    read_store_json,
+    store_json_fetched_at,
+    write_store_json,
+)
+from Data_Retrieval.json_decoding import decode_json
+
+try:
+    # httpx only negotiates HTTP/2 when the h2 package is also installed
+    import h2  # noqa: F401
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from matplotlib import pyplot as plt
+except ImportError:
+    plt = None
 
 ALPHA_SCALE_FACTOR = 3
 STD_SCALE_FACTOR = 0.75
+# Values ranked in this fraction at either end of their industry are coloured
+PERCENTILE_COLOUR_BAND = 0.25
+# Levels the colour alpha is rounded to when cells reference classes instead of inline styles
+COLOUR_CLASS_BUCKETS = 8
+HTTP_TIMEOUT_SECONDS = 60
+HTTP_THROTTLED_RETRIES = 3
+
+http_session = None
+http_session_pool_size = 10
+http_session_lock = threading.Lock()
 
 
 class Leverage(Enum):
@@ -33,19 +71,155 @@ class TrafficLightColors(Enum):
     green = "rgba(159, 255, 148, 0.7)"
 
 
+class CellStyleMode(Enum):
+    # Every cell carries its own style attribute
+    inline = "inline"
+    # Cells reference the bucketed colour classes defined in individual_company_table_css
+    classes = "classes"
+
+
+# Conditional formatting backgrounds, alpha is filled in for the green and red tones
+CELL_TONE_COLOURS = {
+    "clear": "rgba(255, 255, 255, 0)",
+    "unrated": "rgba(0, 0, 0, 00)",
+    "error": "rgba(255, 255, 255, 0.5)",
+    "negative": "rgba(255, 0, 0, 0.5)",
+    "green": "rgba(0, 230, 0, {alpha})",
+    "red": "rgba(230, 0, 0, {alpha})",
+}
+# Short class names for the tones in classes mode, the transparent ones need no class at all
+CELL_TONE_CLASSES = {
+    "clear": "",
+    "unrated": "",
+    "error": "na",
+    "negative": "neg",
+    "green": "g",
+    "red": "r",
+}
+
+
+def get_cell_style_mode() -> CellStyleMode:
+    return CellStyleMode(os.getenv("cell_style_mode", CellStyleMode.inline.value))
+
+
+class PieChartRenderer(Enum):
+    # Wedge paths computed from the values and inlined as SVG
+    svg = "svg"
+    # A PNG rasterised by matplotlib and inlined base64 encoded
+    matplotlib = "matplotlib"
+
+
+PIE_CHART_COLOURS = [
+    "#c4e6a5",
+    "#8099ff",
+    "#DD7596",
+    "#8EB897",
+    "#f5eaab",
+    "#f79797",
+    "#d499e8",
+    "#96e9fa",
+]
+# Wedges of at most this percentage of the total are left without a label or percentage
+PIE_CHART_LABEL_PERCENT = 2.5
+# Sized like the matplotlib chart: radius and 10pt font in pixels of a default figure at 100 dpi
+PIE_CHART_RADIUS = 185
+PIE_CHART_FONT_SIZE = 14
+
+
+def get_pie_chart_renderer() -> PieChartRenderer:
+    renderer = PieChartRenderer(os.getenv("pie_chart_renderer", PieChartRenderer.svg.value))
+    if renderer == PieChartRenderer.matplotlib and plt is None:
+        return PieChartRenderer.svg
+
+    return renderer
+
+
+class RateLimiter:
+    """
+    Spaces out network requests so that no more than max_requests_per_second are started,
+    shared between every thread that fetches through the same limiter.
+    """
+
+    def __init__(self, max_requests_per_second: float | None = None):
+        self.interval = 1 / max_requests_per_second if max_requests_per_second else 0
+        self.next_request_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_request_time - now
+            self.next_request_time = max(now, self.next_request_time) + self.interval
+
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+def create_http_session(pool_size: int):
+    """
+    Creates a keep-alive client so repeated requests to the same host reuse their TCP/TLS connection.
+    Uses httpx over HTTP/2 when available, otherwise a pooled requests session.
+    """
+    if httpx is not None:
+        # httpx advertises every content encoding it has a decoder installed for
+        return httpx.Client(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=pool_size, max_keepalive_connections=pool_size
+            ),
+            timeout=HTTP_TIMEOUT_SECONDS,
+        )
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # gzip and deflate, plus brotli/zstd when urllib3 has their decoders installed
+    session.headers["Accept-Encoding"] = make_headers(accept_encoding=True)[
+        "accept-encoding"
+    ]
+    return session
+
+
+def get_http_session():
+    global http_session
+    with http_session_lock:
+        if http_session is None:
+            http_session = create_http_session(http_session_pool_size)
+
+    return http_session
+
+
+def configure_http_session(pool_size: int) -> None:
+    """Grows the shared connection pool to match the number of concurrent fetches."""
+    global http_session, http_session_pool_size
+    with http_session_lock:
+        if pool_size <= http_session_pool_size:
+            return
+
+        http_session_pool_size = pool_size
+        # Close the old pool's connections, the next request creates the larger pool
+        if http_session is not None:
+            http_session.close()
+        http_session = None
+
+
 def create_file_path(relative_path: str):
     current_directory = os.getcwd()
     return os.path.join(current_directory, relative_path)
 
 
-def return_json_data(relative_path: str):
+def return_json_data(relative_path: str, decoder: Callable = decode_json):
     file_path = create_file_path(relative_path)
 
     try:
         # Read the JSON data from the file
-        with open(file_path, "r") as json_file:
+        with open(file_path, "rb") as json_file:
             print(f'JSON data exists at location: "{relative_path}"')
-            json_data = json.load(json_file)
+            json_data = decoder(json_file)
         return json_data
 
     except FileNotFoundError:
@@ -59,31 +233,149 @@ def return_json_data(relative_path: str):
     return None
 
 
-def save_response_to_file(url: str, file_path: str, override: bool = False):
-    if os.path.exists(file_path) and not override:
-        return return_json_data(file_path)
+def request_json(url: str, rate_limiter: RateLimiter | None = None):
+    # Only requests that actually go out to the API count towards the rate limit
+    if rate_limiter is not None:
+        rate_limiter.wait()
 
-    response = requests.get(url)
+    for attempt in range(HTTP_THROTTLED_RETRIES + 1):
+        response = get_http_session().get(url, timeout=HTTP_TIMEOUT_SECONDS)
+        if response.status_code != 429 or attempt == HTTP_THROTTLED_RETRIES:
+            break
+
+        # Throttled, wait as long as the server asks before trying again
+        try:
+            retry_after = float(response.headers.get("Retry-After", 2**attempt))
+        except ValueError:
+            retry_after = 2**attempt
+        print(f"Request throttled, retrying in {retry_after}s...")
+        time.sleep(retry_after)
 
     # Check if the request was successful
     if response.status_code == 200:
-        json_data = response.json()
+        return response.json()
 
-        # Create directories if they don't exist
-        directory = os.path.dirname(file_path)
-        if not os.path.exists(directory):
-            os.makedirs(directory)
+    print(f"Failed to retrieve data. Status code: {response.status_code}")
+    return None
 
-        # Write the JSON data to the file
-        with open(file_path, "w") as json_file:
-            json.dump(json_data, json_file)
 
-        print(f'JSON data has been saved to "{file_path}"')
-        return json_data
-    else:
-        print(f"Failed to retrieve data. Status code: {response.status_code}")
+def save_json_to_file(json_data, file_path: str) -> None:
+    # Create directories if they don't exist
+    directory = os.path.dirname(file_path)
+    os.makedirs(directory, exist_ok=True)
+
+    # Write the JSON data to the file
+    with open(file_path, "w") as json_file:
+        json.dump(json_data, json_file)
+
+    print(f'JSON data has been saved to "{file_path}"')
+
+
+def get_cached_json_fetched_at(
+    file_path: str, backend: CacheBackend = CacheBackend.json
+) -> float | None:
+    """Returns when the cached JSON was fetched as a unix timestamp, or None if nothing is cached."""
+    if backend == CacheBackend.sqlite:
+        return store_json_fetched_at(file_path)
+
+    if not os.path.exists(file_path):
         return None
 
+    return os.path.getmtime(file_path)
+
+
+def is_cached_json_fresh(json_data, fetched_at: float, max_age: timedelta) -> bool:
+    max_age_seconds = max_age.total_seconds()
+
+    # Fundamentals carry the date EODHD last updated the company. If it had already been unchanged for
+    # longer than max_age when we fetched it, it's unlikely to have changed since, so keep it for longer.
+    try:
+        updated_at = datetime.strptime(json_data["General"]["UpdatedAt"], "%Y-%m-%d")
+        if fetched_at - updated_at.timestamp() > max_age_seconds:
+            max_age_seconds *= QUIET_COMPANY_MAX_AGE_FACTOR
+    except (KeyError, TypeError, ValueError):
+        pass
+
+    return time.time() - fetched_at < max_age_seconds
+
+
+def is_updated_since(json_data, fetched_at: float) -> bool | None:
+    """Whether EODHD updated the company after fetched_at, None if the document doesn't say."""
+    try:
+        updated_at = datetime.strptime(json_data["General"]["UpdatedAt"], "%Y-%m-%d")
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    return updated_at.timestamp() > fetched_at
+
+
+def read_cached_json(
+    file_path: str,
+    backend: CacheBackend = CacheBackend.json,
+    decoder: Callable = decode_json,
+):
+    """Returns the cached JSON stored under file_path, or None if nothing is cached."""
+    if backend == CacheBackend.sqlite:
+        return read_store_json(file_path, decoder)
+
+    if not os.path.exists(file_path):
+        return None
+
+    return return_json_data(file_path, decoder)
+
+
+def write_cached_json(
+    json_data, file_path: str, backend: CacheBackend = CacheBackend.json
+) -> None:
+    if backend == CacheBackend.sqlite:
+        write_store_json(json_data, file_path)
+    else:
+        save_json_to_file(json_data, file_path)
+
+
+def save_response_to_file(
+    url: str,
+    file_path: str,
+    override: bool = False,
+    rate_limiter: RateLimiter | None = None,
+    transform: Callable | None = None,
+    backend: CacheBackend = CacheBackend.json,
+    max_age: timedelta | None = None,
+    decoder: Callable = decode_json,
+    on_write: Callable | None = None,
+):
+    """
+    Returns the cached response for url if there is one, otherwise fetches and caches it.
+    With max_age set, cached data older than max_age (see is_cached_json_fresh) is refetched.
+    decoder is used for cached reads only, fresh responses are returned whole. on_write is
+    called with each response written to the cache.
+    """
+    cached_json_data = None
+    if not override:
+        cached_json_data = read_cached_json(file_path, backend, decoder)
+        if cached_json_data is not None and (
+            max_age is None
+            or is_cached_json_fresh(
+                cached_json_data,
+                get_cached_json_fetched_at(file_path, backend),
+                max_age,
+            )
+        ):
+            return cached_json_data
+
+    json_data = request_json(url, rate_limiter)
+    if json_data is None:
+        # Stale data is better than none if the refetch failed
+        return cached_json_data
+
+    if transform is not None:
+        json_data = transform(json_data)
+
+    write_cached_json(json_data, file_path, backend)
+    if on_write is not None:
+        on_write(json_data)
+    return json_data
+
 
 def handle_divide_by_zero(numerator, denominator):
     if denominator == 0 or denominator is None:
@@ -129,10 +421,15 @@ def calculate_median_absolute_deviation(data):
 
 def format_bold(value):
     """Formats all values in bold."""
+    opening_tag = (
+        '<div class="bold">'
+        if get_cell_style_mode() == CellStyleMode.classes
+        else '<div style="font-weight: bold;">'
+    )
     if isinstance(value, (int, float)):
-        return f'<div style="font-weight: bold;">{value:.2f}</div>'
+        return f"{opening_tag}{value:.2f}</div>"
     else:
-        return f'<div style="font-weight: bold;">{value}</div>'
+        return f"{opening_tag}{value}</div>"
 
 
 def conditionally_format(
@@ -144,53 +441,157 @@ def conditionally_format(
     draw_underline=False,
     red_negative=False,
     dont_round=False,
+    percentile: float | None = None,
 ) -> str:
-    try:
-        # print(f'value: {value}, mean: {average}, std: {std_dev}, z_score: {z_score}, alpha: {alpha}')
+    """
+    Colours a value green or red by its z-score against average and std_dev, or by percentile,
+    its rank within its industry, when given.
+    """
+    values = np.empty(1, dtype=object)
+    values[0] = value
+    return conditionally_format_values(
+        values,
+        average,
+        std_dev,
+        large_positive=large_positive,
+        add_percentage=add_percentage,
+        draw_underline=draw_underline,
+        red_negative=red_negative,
+        dont_round=dont_round,
+        percentile=percentile,
+    )[0]
+
+
+def parse_float_cells(values: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Parses an object array of table cells once. Returns the float of each cell (NaN where float()
+    fails), which cells float() parses and which can also be compared with numbers, i.e. aren't strings.
+    """
+    numbers = np.full(values.shape, np.nan)
+    parsed = np.zeros(values.shape, dtype=bool)
+    comparable = np.zeros(values.shape, dtype=bool)
+    flat_numbers, flat_parsed, flat_comparable = numbers.ravel(), parsed.ravel(), comparable.ravel()
+    for i, value in enumerate(values.ravel()):
+        try:
+            flat_numbers[i] = float(value)
+        except (TypeError, ValueError):
+            continue
+        flat_parsed[i] = True
+        flat_comparable[i] = not isinstance(value, str)
 
-        if red_negative and value < 0:
-            background_color = "rgba(255, 0, 0, 0.5)"
-        else:
-            if average is not None and std_dev is not None:
-                z_score = (float(value) - average) / std_dev
-                alpha = min(1, max(0, abs(z_score) / 2))
-                if large_positive:
-                    background_color = (
-                        f"rgba(0, 230, 0, {alpha / ALPHA_SCALE_FACTOR})"
-                        if value > average + STD_SCALE_FACTOR * std_dev
-                        else (
-                            f"rgba(230, 0, 0, {alpha / ALPHA_SCALE_FACTOR})"
-                            if value < average - STD_SCALE_FACTOR * std_dev
-                            else "rgba(255, 255, 255, 0)"
-                        )
-                    )
-                else:
-                    background_color = (
-                        f"rgba(0, 230, 0, {alpha / ALPHA_SCALE_FACTOR})"
-                        if value < average - STD_SCALE_FACTOR * std_dev
-                        else (
-                            f"rgba(230, 0, 0, {alpha / ALPHA_SCALE_FACTOR})"
-                            if value > average + STD_SCALE_FACTOR * std_dev
-                            else "rgba(255, 255, 255, 0)"
-                        )
-                    )
-            else:
-                background_color = "rgba(0, 0, 0, 00)"
+    return numbers, parsed, comparable
 
-    except (TypeError, ValueError):
-        background_color = "rgba(255, 255, 255, 0.5)"
 
-    string_percent = "%" if add_percentage else ""
-    draw_underline = "border-bottom: 1px solid black;" if draw_underline else ""
-    try:
-        if add_percentage and not dont_round:
-            value = round(float(value))
+def conditionally_format_values(
+    values: np.ndarray,
+    average: [np.ndarray, float, None],
+    std_dev: [np.ndarray, float, None],
+    large_positive=True,
+    add_percentage=False,
+    draw_underline=False,
+    red_negative=False,
+    dont_round=False,
+    percentile: float | None = None,
+) -> np.ndarray:
+    """
+    conditionally_format for a whole object array of cells at once, with average and std_dev
+    scalars or arrays that broadcast against values (e.g. one per row). Colours are picked with
+    NumPy masks, only the display strings are built per cell.
+    """
+    numbers, parsed, comparable = parse_float_cells(values)
+    shape = values.shape
+    tones = np.full(shape, "clear", dtype=object)
+    alphas = np.zeros(shape)
+    coloured_green = np.zeros(shape, dtype=bool)
+    coloured_red = np.zeros(shape, dtype=bool)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if percentile is not None:
+            alphas[:] = abs(percentile - 0.5) * 2
+            ranked_high = percentile > 1 - PERCENTILE_COLOUR_BAND
+            ranked_low = percentile < PERCENTILE_COLOUR_BAND
+            coloured_green[:] = ranked_high if large_positive else ranked_low
+            coloured_red[:] = ranked_low if large_positive else ranked_high
+            invalid = np.zeros(shape, dtype=bool)
+        elif average is not None and std_dev is not None:
+            average = np.broadcast_to(np.asarray(average, dtype=float), shape)
+            std_dev = np.broadcast_to(np.asarray(std_dev, dtype=float), shape)
+            z_scores = (numbers - average) / std_dev
+            alphas = np.nan_to_num(np.minimum(1, np.maximum(0, np.abs(z_scores) / 2)), nan=0)
+            above = numbers > average + STD_SCALE_FACTOR * std_dev
+            below = numbers < average - STD_SCALE_FACTOR * std_dev
+            coloured_green = above if large_positive else below
+            coloured_red = (below & ~above) if large_positive else (above & ~below)
+            invalid = ~comparable
         else:
-            value = round(float(value), 2)
-    except (TypeError, ValueError, OverflowError):
-        return f'<div style="background: {background_color}; color: black; font-weight: bold; {draw_underline}"></div>'
+            tones[:] = "unrated"
+            invalid = np.zeros(shape, dtype=bool)
 
-    return f'<div style="background: {background_color}; color: black; font-weight: bold; {draw_underline}">{value:,}{string_percent}</div>'
+    if red_negative:
+        negative = comparable & (numbers < 0)
+        invalid = ~comparable
+    else:
+        negative = np.zeros(shape, dtype=bool)
+
+    tones[coloured_green] = "green"
+    tones[coloured_red & ~coloured_green] = "red"
+    tones[negative] = "negative"
+    tones[invalid] = "error"
+
+    if add_percentage and not dont_round:
+        displayed = parsed & np.isfinite(numbers)
+        string_percent = "%"
+    else:
+        displayed = parsed
+        string_percent = "%" if add_percentage else ""
+
+    if get_cell_style_mode() == CellStyleMode.classes:
+        buckets = np.clip(np.rint(alphas * COLOUR_CLASS_BUCKETS), 1, COLOUR_CLASS_BUCKETS).astype(int)
+        underline_class = " ul" if draw_underline else ""
+        opening_tags = np.empty(shape, dtype=object)
+        for index in np.ndindex(shape):
+            tone_class = CELL_TONE_CLASSES[tones[index]]
+            if tone_class in ("g", "r"):
+                tone_class += str(buckets[index])
+            opening_tags[index] = f'<div class="cf{" " if tone_class else ""}{tone_class}{underline_class}">'
+    else:
+        alphas = alphas / ALPHA_SCALE_FACTOR
+        underline_style = "border-bottom: 1px solid black;" if draw_underline else ""
+        opening_tags = np.empty(shape, dtype=object)
+        for index in np.ndindex(shape):
+            background_color = CELL_TONE_COLOURS[tones[index]].format(alpha=alphas[index])
+            opening_tags[index] = (
+                f'<div style="background: {background_color}; color: black; font-weight: bold; {underline_style}">'
+            )
+
+    formatted_values = np.empty(shape, dtype=object)
+    for index in np.ndindex(shape):
+        if not displayed[index]:
+            formatted_values[index] = f"{opening_tags[index]}</div>"
+            continue
+
+        number = float(numbers[index])
+        value = round(number) if add_percentage and not dont_round else round(number, 2)
+        formatted_values[index] = f"{opening_tags[index]}{value:,}{string_percent}</div>"
+
+    return formatted_values
+
+
+def calculate_row_statistics(numbers: np.ndarray, parsed: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    Mean and standard deviation of the parsed values of every row. Rows are grouped by how many
+    values they have, so each is reduced over exactly its own values, like np.mean of the row's list.
+    """
+    counts = parsed.sum(axis=1)
+    averages = np.full(len(numbers), np.nan)
+    std_devs = np.full(len(numbers), np.nan)
+    for count in np.unique(counts[counts > 0]):
+        rows = counts == count
+        row_values = numbers[rows][parsed[rows]].reshape(-1, count)
+        averages[rows] = row_values.mean(axis=1)
+        std_devs[rows] = row_values.std(axis=1)
+
+    return averages, std_devs
 
 
 def format_leverage(value: float) -> str:
@@ -202,27 +603,34 @@ def format_leverage(value: float) -> str:
     """
     if isinstance(value, str):
         if value == Leverage.highly_levered.value:
-            background_color = TrafficLightColors.red.value
+            traffic_light = TrafficLightColors.red
         elif value == Leverage.levered.value:
-            background_color = TrafficLightColors.yellow.value
+            traffic_light = TrafficLightColors.yellow
         elif value == Leverage.minimally_levered.value:
-            background_color = TrafficLightColors.light_green.value
+            traffic_light = TrafficLightColors.light_green
         else:
-            background_color = TrafficLightColors.green.value
-        return f'<div style="background: {background_color}; color: black; font-weight: bold;">{value}</div>'
+            traffic_light = TrafficLightColors.green
+        text = value
     elif isinstance(value, (int, float)):
         if value > 0.7:
-            background_color = TrafficLightColors.red.value
+            traffic_light = TrafficLightColors.red
         elif value > 0.4:
-            background_color = TrafficLightColors.yellow.value
+            traffic_light = TrafficLightColors.yellow
         elif value > 0.2:
-            background_color = TrafficLightColors.light_green.value
+            traffic_light = TrafficLightColors.light_green
         else:
-            background_color = TrafficLightColors.green.value
-        return f'<div style="background: {background_color}; color: black; font-weight: bold;">{value:.2f}</div>'
+            traffic_light = TrafficLightColors.green
+        text = f"{value:.2f}"
+    elif get_cell_style_mode() == CellStyleMode.classes:
+        return '<div class="cf">Unknown</div>'
     else:
         return f'<div style=color: black; font-weight: bold;">Unknown</div>'
 
+    if get_cell_style_mode() == CellStyleMode.classes:
+        return f'<div class="cf tl-{traffic_light.name}">{text}</div>'
+
+    return f'<div style="background: {traffic_light.value}; color: black; font-weight: bold;">{text}</div>'
+
 
 def format_leverage_df(df: pd.DataFrame) -> None:
     """
@@ -239,38 +647,28 @@ def format_leverage_df(df: pd.DataFrame) -> None:
 def format_rows(
     df: pd.DataFrame, rows_to_format, large_positive: bool = True, add_percentage=False
 ) -> None:
+    """Colours each row against the mean and standard deviation of its own values."""
     if not rows_to_format:
         rows_to_format = df.index.to_list()
 
-    for row in rows_to_format:
-        values = []
-        try:
-            for cell_value in df.loc[row]:
-                try:
-                    if cell_value is not None:
-                        values.append(float(cell_value))
-                except ValueError:
-                    # Float can't be converted
-                    continue
-        except KeyError:
-            # Row has already been removed before we got here, continue
-            continue
-
-        if not values:
-            continue
-
-        average = np.mean(values)
-        std_dev = np.std(values)
-
-        df.loc[row] = df.loc[row].apply(
-            lambda value: conditionally_format(
-                value,
-                average,
-                std_dev,
-                large_positive=large_positive,
-                add_percentage=add_percentage,
-            )
-        )
+    # Rows already removed are skipped, and a row listed twice is only formatted once
+    rows = [row for row in dict.fromkeys(rows_to_format) if row in df.index]
+    if not rows:
+        return
+
+    values = df.loc[rows].to_numpy(dtype=object)
+    numbers, parsed, _ = parse_float_cells(values)
+    averages, std_devs = calculate_row_statistics(numbers, parsed)
+    has_values = parsed.any(axis=1)
+
+    formatted_values = conditionally_format_values(
+        values[has_values],
+        averages[has_values, np.newaxis],
+        std_devs[has_values, np.newaxis],
+        large_positive=large_positive,
+        add_percentage=add_percentage,
+    )
+    df.loc[[row for row, row_has_values in zip(rows, has_values) if row_has_values]] = formatted_values
 
 
 def format_cell(
@@ -282,17 +680,17 @@ def format_cell(
     add_percentage: bool = False,
     red_negative=False,
     dont_round=False,
+    percentile: float | None = None,
 ) -> None:
-    df[column_name] = df[column_name].apply(
-        lambda value: conditionally_format(
-            value,
-            average,
-            std_dev,
-            large_positive=large_positive,
-            add_percentage=add_percentage,
-            red_negative=red_negative,
-            dont_round=dont_round,
-        )
+    df[column_name] = conditionally_format_values(
+        df[column_name].to_numpy(dtype=object),
+        average,
+        std_dev,
+        large_positive=large_positive,
+        add_percentage=add_percentage,
+        red_negative=red_negative,
+        dont_round=dont_round,
+        percentile=percentile,
     )
 
 
@@ -315,7 +713,8 @@ def create_table_column(df: pd.DataFrame):
     show(data_table)
 
 
-def create_pie_chart(df: pd.DataFrame, components: list[str]) -> (str, None):
+def return_pie_chart_wedges(df: pd.DataFrame, components: list[str]) -> (tuple, None):
+    """The wedge sizes and labels of the components, None if they are all 0."""
     component_values = [df.loc[component] for component in components]
     component_values_as_floats = [
         abs(float(value)) if value.any() else 0.0 for value in component_values
@@ -325,36 +724,34 @@ def create_pie_chart(df: pd.DataFrame, components: list[str]) -> (str, None):
         return None
 
     total = sum(component_values_as_floats)
-    components = [
+    labels = [
         (
             component
             if component in df.index
             and df.loc[component].iloc[0] != ""
-            and (float(df.loc[component]) / total * 100) > 2.5
+            and (float(df.loc[component]) / total * 100) > PIE_CHART_LABEL_PERCENT
             else ""
         )
         for component in components
     ]
+    return component_values_as_floats, labels
 
+
+def create_pie_chart(df: pd.DataFrame, components: list[str]) -> (str, None):
+    wedges = return_pie_chart_wedges(df, components)
+    if wedges is None:
+        return None
+
+    component_values_as_floats, components = wedges
     fig, ax = plt.subplots()
-    autopct = lambda pct: "{:1.1f}%".format(pct) if pct > 2.5 else ""
-
-    colors = [
-        "#c4e6a5",
-        "#8099ff",
-        "#DD7596",
-        "#8EB897",
-        "#f5eaab",
-        "#f79797",
-        "#d499e8",
-        "#96e9fa",
-    ]
+    autopct = lambda pct: "{:1.1f}%".format(pct) if pct > PIE_CHART_LABEL_PERCENT else ""
+
     ax.pie(
         component_values_as_floats,
         labels=components,
         autopct=autopct,
         startangle=90,
-        colors=colors,
+        colors=PIE_CHART_COLOURS,
     )
     ax.axis("equal")
     img_buffer = BytesIO()
@@ -368,6 +765,79 @@ def create_pie_chart(df: pd.DataFrame, components: list[str]) -> (str, None):
     return img_base64
 
 
+def create_svg_pie_chart(df: pd.DataFrame, components: list[str], title: str) -> (str, None):
+    """
+    Draws the same chart as create_pie_chart as inline SVG: wedges counterclockwise from the top,
+    labels just outside the pie and percentages inside it, cropped to the drawn area.
+    """
+    wedges = return_pie_chart_wedges(df, components)
+    if wedges is None:
+        return None
+
+    values, labels = wedges
+    total = sum(values)
+    radius = PIE_CHART_RADIUS
+    # Drawn around the pie's centre at 0, 0, the view box is grown to fit the labels
+    min_x, min_y, max_x, max_y = -radius, -radius, radius, radius
+    shapes = []
+    texts = []
+    start_angle = math.pi / 2
+    for index, (value, label) in enumerate(zip(values, labels)):
+        if value == 0.0:
+            continue
+
+        fraction = value / total
+        end_angle = start_angle + fraction * 2 * math.pi
+        colour = PIE_CHART_COLOURS[index % len(PIE_CHART_COLOURS)]
+        if fraction >= 1.0:
+            shapes.append(f'<circle r="{radius}" fill="{colour}"/>')
+        else:
+            # SVG's y axis points down, so angles are drawn with their sine negated
+            start_x, start_y = radius * math.cos(start_angle), -radius * math.sin(start_angle)
+            end_x, end_y = radius * math.cos(end_angle), -radius * math.sin(end_angle)
+            large_arc = 1 if fraction > 0.5 else 0
+            shapes.append(
+                f'<path d="M0 0L{start_x:.1f} {start_y:.1f}'
+                f'A{radius} {radius} 0 {large_arc} 0 {end_x:.1f} {end_y:.1f}Z" fill="{colour}"/>'
+            )
+
+        middle_angle = (start_angle + end_angle) / 2
+        direction_x, direction_y = math.cos(middle_angle), -math.sin(middle_angle)
+        if label:
+            label_x, label_y = 1.1 * radius * direction_x, 1.1 * radius * direction_y
+            # A rough text width, there is no font metrics to measure it with
+            label_width = len(label) * PIE_CHART_FONT_SIZE * 0.55
+            anchor = "start" if label_x > 0 else "end"
+            if label_x > 0:
+                max_x = max(max_x, label_x + label_width)
+            else:
+                min_x = min(min_x, label_x - label_width)
+            min_y = min(min_y, label_y - PIE_CHART_FONT_SIZE)
+            max_y = max(max_y, label_y + PIE_CHART_FONT_SIZE)
+            texts.append(
+                f'<text x="{label_x:.1f}" y="{label_y:.1f}" text-anchor="{anchor}">'
+                f"{html.escape(label)}</text>"
+            )
+        if fraction * 100 > PIE_CHART_LABEL_PERCENT:
+            texts.append(
+                f'<text x="{0.6 * radius * direction_x:.1f}" y="{0.6 * radius * direction_y:.1f}" '
+                f'text-anchor="middle">{fraction * 100:1.1f}%</text>'
+            )
+        start_angle = end_angle
+
+    min_x, min_y = math.floor(min_x) - 4, math.floor(min_y) - 4
+    width, height = math.ceil(max_x) + 4 - min_x, math.ceil(max_y) + 4 - min_y
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="{min_x} {min_y} {width} {height}" '
+        f'width="{width}" height="{height}" style="max-width: 100%; height: auto;" role="img" '
+        f'aria-label="{html.escape(title)}">'
+        + "".join(shapes)
+        + f'<g font-family="sans-serif" font-size="{PIE_CHART_FONT_SIZE}" dominant-baseline="central">'
+        + "".join(texts)
+        + "</g></svg>"
+    )
+
+
 def validate_ticker(company: str, exchange: str) -> (str, bool):
     code = company["Code"]
 
@@ -413,6 +883,18 @@ def calculate_market_cap(company_dict: dict, price: float) -> float:
     return (shares_outstanding * price) / 1000000
 
 
+def get_company_industry(json_data: dict) -> str:
+    try:
+        industry = json_data["General"]["GicSector"]
+        if not industry or industry == "null":
+            industry = json_data["General"]["Sector"]
+        industry = industry.replace(" ", "_")
+    except (KeyError, AttributeError):
+        industry = "None"
+
+    return industry
+
+
 def validate_common_stock_tickers(company_json: dict, ticker: str) -> bool:
     if not company_json:
         print(f"Could not find company data for {ticker}")
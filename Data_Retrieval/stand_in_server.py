@@ -0,0 +1,284 @@
+"""
+Local stand in for the EODHD and Yahoo Finance APIs, serving recorded fixtures so the fetch path
+can be exercised and measured offline.
+
+    python -m Data_Retrieval.stand_in_server --port 8765 --latency-ms 150 --error-rate 0.01 --max-rps 20
+
+then run with eodhd_base_url=http://127.0.0.1:8765/api and yf_base_url=http://127.0.0.1:8765/yf.
+With --record, requests without a fixture are forwarded to the real services and the responses
+saved as fixtures, so a recording session only needs a valid api token in its requests.
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlencode, urlsplit
+
+import requests
+
+from Data_Retrieval.eodhd_apis import EODHD_BASE_URL
+from Data_Retrieval.shared_functions import RateLimiter
+
+# Query parameters that don't change the response and are left out of fixture names
+IGNORED_QUERY_PARAMETERS = ["api_token", "fmt"]
+
+
+def get_default_fixtures_directory() -> str:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(script_dir), "Data/Fixtures")
+
+
+def get_fixture_path(fixtures_directory: str, path: str, query: dict) -> str:
+    """
+    Maps a request onto its fixture file, e.g. /api/fundamentals/BHP.AU?filter=General
+    -> {fixtures_directory}/fundamentals/BHP.AU__filter=General.json
+    """
+    path = path.strip("/").removeprefix("api/")
+    parameters = {
+        key: values[0]
+        for key, values in sorted(query.items())
+        if key not in IGNORED_QUERY_PARAMETERS
+    }
+    name = path
+    if parameters:
+        name += "__" + quote(urlencode(parameters), safe="=&,:")
+    return os.path.join(fixtures_directory, f"{name}.json")
+
+
+def filter_fundamentals(json_data: dict, filters: str) -> dict:
+    """Applies an EODHD filter to a full fundamentals fixture, keyed by filter path like the API."""
+    filtered_data = {}
+    for path in filters.split(","):
+        value = json_data
+        for key in path.split("::"):
+            value = value.get(key) if isinstance(value, dict) else None
+        filtered_data[path] = value
+
+    # A single filter returns the bare section
+    if len(filtered_data) == 1:
+        return next(iter(filtered_data.values()))
+
+    return filtered_data
+
+
+class ThrottleWindow:
+    """Counts requests per second and reports when the configured ceiling is exceeded."""
+
+    def __init__(self, max_requests_per_second: float | None):
+        self.max_requests_per_second = max_requests_per_second
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.lock = threading.Lock()
+
+    def is_throttled(self) -> bool:
+        if not self.max_requests_per_second:
+            return False
+
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= 1:
+                self.window_start = now
+                self.window_count = 0
+            self.window_count += 1
+            return self.window_count > self.max_requests_per_second
+
+
+class StandInRequestHandler(BaseHTTPRequestHandler):
+    # Set on the subclass created by create_stand_in_server
+    settings = {}
+    throttle_window = None
+    upstream_rate_limiter = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+
+        latency_ms = self.settings["latency_ms"]
+        if latency_ms:
+            jitter_ms = self.settings["latency_jitter_ms"]
+            time.sleep(max(0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000)
+
+        if self.throttle_window.is_throttled():
+            self.send_json(429, {"error": "Too Many Requests"}, {"Retry-After": "1"})
+            return
+
+        if random.random() < self.settings["error_rate"]:
+            self.send_json(500, {"error": "Injected error"})
+            return
+
+        if url.path.startswith("/yf/prices"):
+            json_data = self.get_yf_prices(query)
+        else:
+            json_data = self.get_eodhd_response(url.path, query)
+
+        if json_data is None:
+            self.send_json(404, {"error": f"No fixture for {self.path}"})
+        else:
+            self.send_json(200, json_data)
+
+    def get_eodhd_response(self, path: str, query: dict):
+        fixtures_directory = self.settings["fixtures_directory"]
+        fixture_path = get_fixture_path(fixtures_directory, path, query)
+        json_data = read_fixture(fixture_path)
+        if json_data is not None:
+            return json_data
+
+        # Filtered fundamentals can be cut from a recorded full document
+        if "filter" in query and "/fundamentals/" in path:
+            full_query = {key: value for key, value in query.items() if key != "filter"}
+            json_data = read_fixture(get_fixture_path(fixtures_directory, path, full_query))
+            if json_data is not None:
+                return filter_fundamentals(json_data, query["filter"][0])
+
+        # Pages of bulk fundamentals can be cut from a recording of the whole exchange
+        if "/bulk-fundamentals/" in path:
+            json_data = read_fixture(get_fixture_path(fixtures_directory, path, {}))
+            if json_data is not None:
+                offset = int(query.get("offset", ["0"])[0])
+                limit = int(query.get("limit", ["500"])[0])
+                companies = list(json_data.values()) if isinstance(json_data, dict) else json_data
+                page = companies[offset : offset + limit]
+                return {str(offset + i): company for i, company in enumerate(page)}
+
+        if not self.settings["record"]:
+            return None
+
+        return self.record_eodhd_response(path, query, fixture_path)
+
+    def record_eodhd_response(self, path: str, query: dict, fixture_path: str):
+        self.upstream_rate_limiter.wait()
+        upstream_path = path.strip("/").removeprefix("api/")
+        response = requests.get(
+            f"{self.settings['upstream_url']}/{upstream_path}",
+            params={key: values[0] for key, values in query.items()},
+            timeout=60,
+        )
+        if response.status_code != 200:
+            print(f"Upstream returned {response.status_code} for {upstream_path}")
+            return None
+
+        json_data = response.json()
+        write_fixture(fixture_path, json_data)
+        return json_data
+
+    def get_yf_prices(self, query: dict) -> dict:
+        symbols = query.get("symbols", [""])[0].split(",")
+        fixture_path = os.path.join(self.settings["fixtures_directory"], "yf/prices.json")
+        prices = read_fixture(fixture_path) or {}
+
+        missing_symbols = [symbol for symbol in symbols if symbol and symbol not in prices]
+        if missing_symbols and self.settings["record"]:
+            # Imported here so serving fixtures doesn't need yfinance
+            from Data_Retrieval.yf_apis import download_close_prices
+
+            with fixture_lock:
+                # Straight to Yahoo, yf_base_url may point back at this server
+                prices.update(download_close_prices(missing_symbols, use_stand_in=False))
+                write_fixture(fixture_path, prices)
+
+        return {symbol: prices[symbol] for symbol in symbols if symbol in prices}
+
+    def send_json(self, status_code: int, json_data, headers: dict | None = None) -> None:
+        body = json.dumps(json_data).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.settings["verbose"]:
+            super().log_message(format, *args)
+
+
+fixture_lock = threading.Lock()
+
+
+def read_fixture(fixture_path: str):
+    if not os.path.exists(fixture_path):
+        return None
+
+    with open(fixture_path, "r") as fixture_file:
+        return json.load(fixture_file)
+
+
+def write_fixture(fixture_path: str, json_data) -> None:
+    os.makedirs(os.path.dirname(fixture_path), exist_ok=True)
+    with open(fixture_path, "w") as fixture_file:
+        json.dump(json_data, fixture_file)
+    print(f'Recorded fixture "{fixture_path}"')
+
+
+def create_stand_in_server(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    fixtures_directory: str | None = None,
+    latency_ms: float = 0,
+    latency_jitter_ms: float = 0,
+    error_rate: float = 0,
+    max_requests_per_second: float | None = None,
+    record: bool = False,
+    upstream_url: str = EODHD_BASE_URL,
+    verbose: bool = False,
+) -> ThreadingHTTPServer:
+    handler = type(
+        "ConfiguredStandInRequestHandler",
+        (StandInRequestHandler,),
+        {
+            "settings": {
+                "fixtures_directory": fixtures_directory or get_default_fixtures_directory(),
+                "latency_ms": latency_ms,
+                "latency_jitter_ms": latency_jitter_ms,
+                "error_rate": error_rate,
+                "record": record,
+                "upstream_url": upstream_url.rstrip("/"),
+                "verbose": verbose,
+            },
+            "throttle_window": ThrottleWindow(max_requests_per_second),
+            # Be gentle with the real API while recording
+            "upstream_rate_limiter": RateLimiter(5),
+        },
+    )
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand in for the EODHD and Yahoo Finance APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixtures", default=None, help="Fixtures directory, defaults to Data/Fixtures")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of requests answered with a 500")
+    parser.add_argument("--max-rps", type=float, default=None, help="Requests per second before answering 429")
+    parser.add_argument("--record", action="store_true", help="Forward requests without a fixture upstream and record them")
+    parser.add_argument("--upstream-url", default=EODHD_BASE_URL)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = create_stand_in_server(
+        args.host,
+        args.port,
+        args.fixtures,
+        args.latency_ms,
+        args.latency_jitter_ms,
+        args.error_rate,
+        args.max_rps,
+        args.record,
+        args.upstream_url,
+        args.verbose,
+    )
+    print(f"Stand in server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+
+from Data_Retrieval.eodhd_apis import get_tickers_by_exchange, get_tickers_file_path
+from Data_Retrieval.shared_functions import (
+    return_json_data,
+    save_json_to_file,
+    validate_ticker,
+)
+
+# Catalogs already loaded this run, keyed by exchange code
+symbol_catalogs = {}
+
+
+def get_symbol_catalog_file_path(exchange_code: str) -> str:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(
+        os.path.dirname(script_dir),
+        f"Data/Tickers/catalog_{exchange_code}.json",
+    )
+
+
+def build_symbol_catalog(tickers: list, tickers_fetched_at: float) -> dict:
+    """
+    Indexes an exchange symbol list by code and applies the validate_ticker rules once, keeping
+    the common stocks that pass them grouped by the exchange they are listed on.
+    """
+    symbols = {}
+    common_stock = {}
+    for company in tickers:
+        symbols[company["Code"]] = company
+        listing_exchange = company["Exchange"]
+        if validate_ticker(company, listing_exchange):
+            common_stock.setdefault(listing_exchange, []).append(company["Code"])
+
+    return {
+        "TickersFetchedAt": tickers_fetched_at,
+        "Symbols": symbols,
+        "CommonStock": common_stock,
+    }
+
+
+def get_symbol_catalog(api_token: str, exchange_code: str, override: bool = False) -> dict | None:
+    """
+    Returns the catalog for the exchange: {"Symbols": {code: record}, "CommonStock": {listing exchange: [codes]}}.
+    The catalog is persisted next to the tickers file and only rebuilt when the tickers are refetched.
+    """
+    if exchange_code in symbol_catalogs and not override:
+        return symbol_catalogs[exchange_code]
+
+    tickers = get_tickers_by_exchange(api_token, exchange_code, override)
+    if not tickers:
+        return None
+
+    tickers_fetched_at = os.path.getmtime(get_tickers_file_path(exchange_code))
+    catalog_file_path = get_symbol_catalog_file_path(exchange_code)
+    catalog = None
+    if os.path.exists(catalog_file_path):
+        catalog = return_json_data(catalog_file_path)
+
+    if not catalog or catalog["TickersFetchedAt"] != tickers_fetched_at:
+        catalog = build_symbol_catalog(tickers, tickers_fetched_at)
+        save_json_to_file(catalog, catalog_file_path)
+
+    # Sets for constant time validity checks, these aren't persisted
+    catalog["CommonStockSets"] = {
+        listing_exchange: set(codes)
+        for listing_exchange, codes in catalog["CommonStock"].items()
+    }
+    symbol_catalogs[exchange_code] = catalog
+    return catalog
+
+
+def get_common_stock_codes(catalog: dict, listing_exchange: str) -> list:
+    return catalog["CommonStock"].get(listing_exchange, [])
+
+
+def lookup_common_stock(catalog: dict, code: str, listing_exchange: str) -> dict | None:
+    """Returns the symbol record if the code is a valid common stock on the exchange."""
+    if code not in catalog["CommonStockSets"].get(listing_exchange, ()):
+        return None
+
+    return catalog["Symbols"][code]
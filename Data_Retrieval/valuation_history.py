@@ -0,0 +1,133 @@
+import glob
+import os
+import time
+from datetime import date, datetime
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Columns that identify a row, everything else in a run's ordered_dict is a metric
+VALUATION_HISTORY_KEYS = ["Code", "Exchange", "Industry"]
+# A company has one row per run date, the latest run's when it was recorded more than once
+VALUATION_HISTORY_UNIQUE_KEYS = ["Exchange", "Code"]
+# Rows per Parquet row group, ticker scans skip the groups whose Code range doesn't match
+VALUATION_HISTORY_ROW_GROUP_SIZE = 1000
+
+
+def get_valuation_history_directory() -> str:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(script_dir), "Data/Fundamentals/Valuation_History")
+
+
+def get_partition_directory(run_date: date) -> str:
+    return os.path.join(get_valuation_history_directory(), f"date={run_date.isoformat()}")
+
+
+def record_valuation_history(rows: list[dict], run_date: date | None = None) -> None:
+    """
+    Appends a run's valuation rows (ordered_dict plus Exchange and Industry) to the history as a
+    new file in the run date's partition. Files are never rewritten, so runs only ever add to it.
+    Called once per exchange run, a company in rows more than once is kept with its last values.
+    Written as Parquet when pyarrow is installed, otherwise as gzipped CSV.
+    """
+    if not rows:
+        return
+
+    run_date = run_date or datetime.now().date()
+    history_df = pd.DataFrame.from_records(rows)
+    history_df = history_df.drop_duplicates(VALUATION_HISTORY_UNIQUE_KEYS, keep="last")
+    metrics = [column for column in history_df.columns if column not in VALUATION_HISTORY_KEYS]
+    history_df[metrics] = history_df[metrics].apply(pd.to_numeric, errors="coerce").astype(float)
+    history_df = history_df.sort_values("Code", kind="stable")
+
+    partition_directory = get_partition_directory(run_date)
+    os.makedirs(partition_directory, exist_ok=True)
+    exchanges = "_".join(sorted(history_df["Exchange"].astype(str).unique()))
+    file_name = f"{exchanges}-{time.time_ns()}"
+    if pa is not None:
+        file_path = os.path.join(partition_directory, f"{file_name}.parquet")
+        pq.write_table(
+            pa.Table.from_pandas(history_df, preserve_index=False),
+            file_path,
+            row_group_size=VALUATION_HISTORY_ROW_GROUP_SIZE,
+        )
+        # Read the footer back, a file that can't be scanned would otherwise only show up in a later read
+        written_rows = pq.read_metadata(file_path).num_rows
+        if written_rows != len(history_df):
+            raise IOError(f'Wrote {written_rows} of {len(history_df)} valuations to "{file_path}"')
+    else:
+        file_path = os.path.join(partition_directory, f"{file_name}.csv.gz")
+        history_df.to_csv(file_path, index=False)
+
+    print(f'Recorded {len(history_df)} valuations to "{file_path}"')
+
+
+def read_valuation_history(
+    codes: list[str] | None = None,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    exchange: str | None = None,
+) -> pd.DataFrame:
+    """
+    Returns the recorded valuations of the given companies (all if None) between start_date and
+    end_date inclusive, one row per company and run date with the Date, the latest run's if it
+    was recorded more than once that day. Only the partitions in the date range are opened.
+    """
+    history_dfs = []
+    for partition_directory in sorted(glob.glob(os.path.join(get_valuation_history_directory(), "date=*"))):
+        run_date = date.fromisoformat(os.path.basename(partition_directory).removeprefix("date="))
+        if (start_date and run_date < start_date) or (end_date and run_date > end_date):
+            continue
+
+        # Oldest first, so the last of a company's rows on the day is its latest
+        for file_path in sorted(os.listdir(partition_directory), key=return_history_file_time):
+            if exchange is not None and exchange not in file_path.split("-")[0].split("_"):
+                continue
+
+            history_df = read_history_file(os.path.join(partition_directory, file_path), codes)
+            if history_df is None or history_df.empty:
+                continue
+
+            history_df.insert(0, "Date", pd.Timestamp(run_date))
+            history_dfs.append(history_df)
+
+    if not history_dfs:
+        return pd.DataFrame(columns=["Date", *VALUATION_HISTORY_KEYS])
+
+    history_df = pd.concat(history_dfs, ignore_index=True)
+    if exchange is not None:
+        history_df = history_df[history_df["Exchange"] == exchange]
+    history_df = history_df.drop_duplicates(["Date", *VALUATION_HISTORY_UNIQUE_KEYS], keep="last")
+
+    return history_df.sort_values(["Code", "Date"], kind="stable", ignore_index=True)
+
+
+def return_history_file_time(file_name: str) -> int:
+    # Files are named {exchanges}-{time_ns}.parquet (or .csv.gz)
+    try:
+        return int(file_name.split("-")[-1].split(".")[0])
+    except ValueError:
+        return 0
+
+
+def read_history_file(file_path: str, codes: list[str] | None) -> pd.DataFrame | None:
+    if file_path.endswith(".parquet"):
+        if pa is None:
+            print(f'pyarrow is needed to read "{file_path}"')
+            return None
+
+        filters = [("Code", "in", list(codes))] if codes is not None else None
+        return pq.read_table(file_path, filters=filters).to_pandas()
+
+    if file_path.endswith(".csv.gz"):
+        history_df = pd.read_csv(file_path, dtype={key: str for key in VALUATION_HISTORY_KEYS})
+        if codes is not None:
+            history_df = history_df[history_df["Code"].isin(codes)]
+        return history_df
+
+    return None
@@ -1,23 +1,48 @@
+import os
+import time
+
+import pandas as pd
 import yfinance as yf
 
+from Data_Retrieval.shared_functions import request_json
 
-def retrieve_stock_price(exchange: str, ticker: str) -> float | None:
-    if exchange.lower() == "au":
-        ticker = ticker + ".AX"
+# Yahoo Finance symbols are the exchange code plus a per-exchange suffix
+YF_EXCHANGE_SUFFIXES = {
+    "au": ".AX",
+    "to": ".TO",
+    "v": ".V",
+    "lse": ".L",
+    "jse": ".JO",
+}
+YF_DOWNLOAD_CHUNK_SIZE = 200
+YF_RATE_LIMIT_RETRIES = 3
+YF_RATE_LIMIT_BACKOFF_SECONDS = 30
+
+
+def get_yf_stand_in_url() -> str | None:
+    # yf_base_url serves prices from the local stand in server instead of Yahoo Finance
+    base_url = os.getenv("yf_base_url")
+    return base_url.rstrip("/") if base_url else None
+
+
+def convert_to_yf_ticker(exchange: str, ticker: str) -> str:
+    return ticker + YF_EXCHANGE_SUFFIXES.get(exchange.lower(), "")
 
-    if exchange.lower() == "to":
-        ticker = ticker + ".TO"
 
-    if exchange.lower() == "v":
-        ticker = ticker + ".V"
-    
+def convert_yf_price(exchange: str, price: float) -> float:
+    # Basic conversions
+    # LSE shows price in pence, not pounds
     if exchange.lower() == "lse":
-        ticker = ticker + ".L"
+        price /= 100
+
+    return price
 
-    if exchange.lower() == "jse":
-        ticker = ticker + ".JO"
 
-    cda = yf.Ticker(ticker)
+def retrieve_stock_price(exchange: str, ticker: str) -> float | None:
+    if get_yf_stand_in_url():
+        return retrieve_stock_prices(exchange, [ticker]).get(ticker)
+
+    cda = yf.Ticker(convert_to_yf_ticker(exchange, ticker))
     try:
         price_history = cda.history(period="1d")
         if not price_history["Close"].empty:
@@ -26,11 +51,64 @@ def retrieve_stock_price(exchange: str, ticker: str) -> float | None:
             return None
     except yf.exceptions.YFRateLimitError:
         print("Rate limited, continuing...")
-        company_price = None
+        return None
 
-    # Basic conversions
-    # LSE shows price in pence, not pounds
-    if exchange.lower() == "lse":
-        company_price /= 100
+    return convert_yf_price(exchange, company_price)
+
+
+def download_close_prices(symbols: list[str], use_stand_in: bool = True) -> dict[str, float]:
+    """
+    Downloads the latest close for many Yahoo symbols in one multi-symbol request.
+    use_stand_in=False always goes to Yahoo Finance, for the stand in server recording its fixtures.
+    """
+    stand_in_url = get_yf_stand_in_url() if use_stand_in else None
+    if stand_in_url:
+        return request_json(f"{stand_in_url}/prices?symbols={','.join(symbols)}") or {}
+
+    for attempt in range(YF_RATE_LIMIT_RETRIES):
+        try:
+            # A few days of history so symbols that didn't trade today still have a last close
+            price_history = yf.download(
+                symbols,
+                period="5d",
+                auto_adjust=True,
+                group_by="column",
+                progress=False,
+                threads=True,
+            )
+            break
+        except yf.exceptions.YFRateLimitError:
+            print(f"Rate limited, retrying in {YF_RATE_LIMIT_BACKOFF_SECONDS * (attempt + 1)}s...")
+            time.sleep(YF_RATE_LIMIT_BACKOFF_SECONDS * (attempt + 1))
+    else:
+        return {}
+
+    if price_history is None or price_history.empty:
+        return {}
+
+    close_prices = price_history["Close"]
+    if isinstance(close_prices, pd.Series):
+        close_prices = close_prices.to_frame(symbols[0])
+
+    last_close_prices = close_prices.ffill().iloc[-1].dropna()
+    return last_close_prices.to_dict()
+
+
+def retrieve_stock_prices(
+    exchange: str, tickers: list[str], chunk_size: int = YF_DOWNLOAD_CHUNK_SIZE
+) -> dict[str, float]:
+    """
+    Returns a ticker -> price mapping for every ticker on the exchange that Yahoo has a
+    recent close for, downloading chunk_size symbols per request.
+    """
+    yf_tickers = {convert_to_yf_ticker(exchange, ticker): ticker for ticker in tickers}
+    symbols = list(yf_tickers)
+
+    prices = {}
+    for start in range(0, len(symbols), chunk_size):
+        close_prices = download_close_prices(symbols[start : start + chunk_size])
+        for symbol, price in close_prices.items():
+            prices[yf_tickers[symbol]] = convert_yf_price(exchange, price)
 
-    return company_price
+    print(f"Retrieved {len(prices)}/{len(tickers)} prices for exchange {exchange}")
+    return prices
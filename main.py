@@ -1,15 +1,18 @@
 import os
 import sys
-import time
 import shutil
 
 from typing import List
 
 from dotenv import load_dotenv
 
+import Data_Formatting.exchange_panel as exchange_panel
 import Data_Formatting.html_formatter_individual as fm
 import Data_Retrieval.eodhd_apis as eodhd
+import Data_Retrieval.mean_std_industry_valuation as valuation
 import Data_Retrieval.shared_functions as helper
+import Data_Retrieval.symbol_catalog as symbol_catalog
+import Data_Retrieval.valuation_history as valuation_history
 import Data_Retrieval.yf_apis as yf_apis
 
 load_dotenv()
@@ -19,41 +22,40 @@ EODHD_API_TOKEN = os.getenv("eodhd_api_token")
 def save_formatted_individual_finances_by_ticker(
     region: str, exchange: str, ticker: str, force_update: bool = False, **kwargs
 ) -> None:
-    tickers = kwargs.get("tickers", None)
-    if not tickers:
-        tickers = eodhd.get_tickers_by_exchange(EODHD_API_TOKEN, exchange)
-        if not tickers:
-            print(f"Failed to retrieve tickers: {exchange}")
-            return
-
     ticker = ticker.upper().strip()
     exchange = exchange.upper().strip()
     region = region.upper().strip()
-    for company in tickers:
-        if company["Code"] == ticker:
-            if not helper.validate_ticker(company, exchange):
-                continue
 
-            ticker = company["Code"]
-            company_json = eodhd.get_fundamental_data(EODHD_API_TOKEN, region, ticker, override=force_update)
-            if not helper.validate_common_stock_tickers(company_json, ticker):
-                return
+    catalog = kwargs.get("catalog", None)
+    if not catalog:
+        catalog = symbol_catalog.get_symbol_catalog(EODHD_API_TOKEN, exchange)
+        if not catalog:
+            print(f"Failed to retrieve tickers: {exchange}")
+            return
+
+    if not symbol_catalog.lookup_common_stock(catalog, ticker, exchange):
+        print(f"Could not find ticker information for {ticker}")
+        return
 
-            company_price = kwargs.get("price", None)
-            if not company_price:
-                company_price = yf_apis.retrieve_stock_price(exchange, ticker)
+    company_json = eodhd.get_fundamental_data(EODHD_API_TOKEN, region, ticker, override=force_update)
+    if not helper.validate_common_stock_tickers(company_json, ticker):
+        return
 
-            fm.print_individual_finances(company_json, current_price=company_price)
-            return
+    company_price = kwargs.get("price", None)
+    if not company_price:
+        company_price = yf_apis.retrieve_stock_price(exchange, ticker)
 
-    print(f"Could not find ticker information for {ticker}")
+    fm.print_individual_finances(company_json, current_price=company_price)
 
 
 def save_formatted_individual_finances_by_list_tickers(region: str, exchange: str, tickers: List[str]):
-    tickers_on_exchange = eodhd.get_tickers_by_exchange(EODHD_API_TOKEN, exchange)
+    catalog = symbol_catalog.get_symbol_catalog(EODHD_API_TOKEN, exchange.upper().strip())
+    tickers = [ticker.upper().strip() for ticker in tickers]
+    prices = yf_apis.retrieve_stock_prices(exchange, tickers)
     for ticker in tickers:
-        time.sleep(3.0)
-        save_formatted_individual_finances_by_ticker(region, exchange, ticker, True, tickers=tickers_on_exchange)
+        save_formatted_individual_finances_by_ticker(
+            region, exchange, ticker, True, catalog=catalog, price=prices.get(ticker)
+        )
 
 
 def save_formatted_individual_finances_by_exchange(
@@ -61,53 +63,116 @@ def save_formatted_individual_finances_by_exchange(
     exchange: str,
     max_tickers: int | None = None,
     min_mkt_cap_mil: int | None = None,
-    sleep: bool = False,
     use_eodhd_apis: bool = False,
-    override: bool = False, 
+    override: bool = False,
+    jobs: int = 1,
+    max_requests_per_second: float | None = None,
+    sections_only: bool = True,
+    warm_cache: bool = False,
 ) -> None:
     exchange = exchange.upper().strip()
     region = region.upper().strip()
-    tickers = eodhd.get_tickers_by_exchange(EODHD_API_TOKEN, region)
-
-    company_count = 0
-    if tickers:
-        for company in tickers:
-            if max_tickers is not None and company_count >= max_tickers:
-                break
-
-            if not helper.validate_ticker(company, exchange):
-                continue
-
-            ticker = company["Code"]
-            company_json = eodhd.get_fundamental_data(EODHD_API_TOKEN, region, ticker, override=override)
-            if not helper.validate_common_stock_tickers(company_json, ticker):
-                continue
-
-            if use_eodhd_apis:
-                print('eodhd')
-                company_price = eodhd.get_stock_close_price(
-                    EODHD_API_TOKEN, region, ticker
-                )
-            else:
-                if sleep:
-                    time.sleep(3.0)
-                company_price = yf_apis.retrieve_stock_price(exchange, ticker)
-
-            if not company_price:
-                print(f"Can't find the price for {ticker}")
-                continue
-
-            if (
-                min_mkt_cap_mil
-                and helper.calculate_market_cap(company_json, company_price)
-                < min_mkt_cap_mil
-            ):
-                continue
-
-            fm.print_individual_finances(company_json, current_price=company_price)
-            company_count += 1
-    else:
+    if warm_cache and sections_only:
+        # Fill the uncached companies a few hundred per request before the per ticker loop. Their
+        # documents only have the bulk endpoint's few years until they are refetched after max_age
+        eodhd.cache_bulk_fundamental_data(EODHD_API_TOKEN, region, override=override)
+
+    catalog = symbol_catalog.get_symbol_catalog(EODHD_API_TOKEN, region)
+    ticker_codes = symbol_catalog.get_common_stock_codes(catalog, exchange) if catalog else []
+    if not ticker_codes:
         print(f"Could not find any ticker on exchange {exchange}")
+        return
+
+    # Prices for the whole exchange are resolved up front, in one bulk request or a few batched downloads
+    if use_eodhd_apis:
+        prices = eodhd.get_bulk_close_prices(EODHD_API_TOKEN, region)
+    else:
+        prices = yf_apis.retrieve_stock_prices(exchange, ticker_codes)
+
+    # Fundamentals are fetched ahead of the formatting below, either serially or with `jobs` requests in flight
+    if jobs > 1:
+        company_jsons = eodhd.get_fundamental_data_concurrently(
+            EODHD_API_TOKEN,
+            region,
+            ticker_codes,
+            jobs=jobs,
+            max_requests_per_second=max_requests_per_second,
+            override=override,
+            sections_only=sections_only,
+        )
+    else:
+        rate_limiter = helper.RateLimiter(max_requests_per_second)
+        company_jsons = (
+            (
+                ticker,
+                eodhd.get_fundamental_data(
+                    EODHD_API_TOKEN,
+                    region,
+                    ticker,
+                    override=override,
+                    rate_limiter=rate_limiter,
+                    sections_only=sections_only,
+                ),
+            )
+            for ticker in ticker_codes
+        )
+
+    # Read every company into one panel first, so the metrics are computed for the whole exchange at once
+    # and each company is rendered against the statistics of its whole industry
+    panel = exchange_panel.create_exchange_panel()
+    panel_tickers = []
+    missing_price_count = 0
+    for ticker, company_json in company_jsons:
+        if max_tickers is not None and len(panel_tickers) >= max_tickers:
+            break
+
+        if not helper.validate_common_stock_tickers(company_json, ticker):
+            continue
+
+        company_price = prices.get(ticker)
+        if not company_price and not use_eodhd_apis:
+            # Symbols a batched download missed are priced one at a time, like before the batching
+            company_price = yf_apis.retrieve_stock_price(exchange, ticker)
+
+        if not company_price:
+            print(f"Can't find the price for {ticker}")
+            missing_price_count += 1
+            continue
+
+        if (
+            min_mkt_cap_mil
+            and helper.calculate_market_cap(company_json, company_price)
+            < min_mkt_cap_mil
+        ):
+            continue
+
+        if exchange_panel.add_company_to_panel(panel, company_json, company_price):
+            panel_tickers.append(ticker)
+
+    company_jsons.close()
+    if missing_price_count:
+        print(f"Skipped {missing_price_count} companies on {exchange} without a price")
+    computed_companies = list(
+        zip(panel_tickers, fm.compute_exchange_finances(exchange_panel.stack_exchange_panel(panel)))
+    )
+
+    for computed_exchange in {computed_finances["Exchange"] for _, computed_finances in computed_companies}:
+        valuation.aggregate_industry_valuations(computed_exchange)
+
+    # The valuation store only keeps each company's latest values, the history keeps every run's
+    valuation_history.record_valuation_history(
+        fm.return_valuation_history_rows([computed_finances for _, computed_finances in computed_companies])
+    )
+
+    # Read back from the cache without refetching, so each company is rendered from the document it
+    # was computed from, rather than holding every document in memory alongside its computed finances
+    for ticker, computed_finances in computed_companies:
+        company_json = eodhd.read_cached_fundamental_data(region, ticker, sections_only=sections_only)
+        if not company_json:
+            print(f"Could not reload fundamentals for {ticker}")
+            continue
+
+        fm.render_individual_finances(company_json, computed_finances)
 
 
 def remove_fundamentals_data(region: str, exchange: str):
@@ -129,7 +194,7 @@ def remove_fundamentals_data(region: str, exchange: str):
 
 
 def update_ticker_data(exchange: str):
-    eodhd.get_tickers_by_exchange(EODHD_API_TOKEN, exchange, True)
+    symbol_catalog.get_symbol_catalog(EODHD_API_TOKEN, exchange, True)
 
 
 def initial_setup():
@@ -137,17 +202,26 @@ def initial_setup():
     exchange = "au"
     min_mkt_cap_mil = 0
     use_eodhd_apis = True
-    sleep = not use_eodhd_apis
 
     save_formatted_individual_finances_by_exchange(
         region,
         exchange,
         min_mkt_cap_mil=min_mkt_cap_mil,
-        sleep=sleep,
         use_eodhd_apis=use_eodhd_apis,
     )
 
 
+def get_command_line_option(name: str, default: str | None = None) -> str | None:
+    """Returns the value of an optional `--name value` or `--name=value` argument."""
+    for i, arg in enumerate(sys.argv):
+        if arg.startswith(f"--{name}="):
+            return arg.split("=", 1)[1]
+        if arg == f"--{name}" and i + 1 < len(sys.argv):
+            return sys.argv[i + 1]
+
+    return default
+
+
 def main():
     if len(sys.argv) > 1:
         run_type = sys.argv[1]
@@ -157,14 +231,21 @@ def main():
             exchange = sys.argv[3]
             min_mkt_cap_mil = int(sys.argv[4])
             use_eodhd_apis = bool(int(sys.argv[5]))
+            # Optional: --jobs 8 --max-rps 10 --warm-cache 1
+            jobs = int(get_command_line_option("jobs", "1"))
+            warm_cache = bool(int(get_command_line_option("warm-cache", "0")))
+            max_requests_per_second = get_command_line_option("max-rps")
+            if max_requests_per_second is not None:
+                max_requests_per_second = float(max_requests_per_second)
 
-            sleep = not use_eodhd_apis
             save_formatted_individual_finances_by_exchange(
                 region,
                 exchange,
                 min_mkt_cap_mil=min_mkt_cap_mil,
-                sleep=sleep,
                 use_eodhd_apis=use_eodhd_apis,
+                jobs=jobs,
+                max_requests_per_second=max_requests_per_second,
+                warm_cache=warm_cache,
             )
 
         if run_type == "remove_fundamentals":